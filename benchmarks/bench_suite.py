@@ -0,0 +1,300 @@
+"""
+Benchmark suite: converts synthetic CSV and xlsx files of several shapes and sizes headlessly,
+times every phase and records its peak memory and rows/s, and compares the results against a
+stored baseline. The GUI phase runs on Qt's offscreen platform, so no display is needed.
+
+usage: python benchmarks/bench_suite.py --save-baseline          # record benchmarks/baseline.json
+       python benchmarks/bench_suite.py                          # compare, exit code 1 on regressions
+       python benchmarks/bench_suite.py --shapes tall,text --sizes medium --formats csv
+       python benchmarks/bench_suite.py --format-workers 8          # also time generation on 8 processes
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from converter import (build_column_specs, dataframe_chunks, iter_chunks, load_dataframe, read_sample, # noqa: E402
+                       write_sql_file)
+from instrumentation import peak_rss_mb, reset_peak_rss # noqa: E402
+from parallel_format import ParallelFormatter # noqa: E402
+
+SIZES = {'small': 10000, 'medium': 100000, 'large': 1000000} # Rows of the tall shapes
+FORMATS = ['csv', 'xlsx']
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'excel_to_sql_bench') # Generated inputs, reused across runs
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+TIME_THRESHOLD = 0.25 # A phase regresses when it is this much slower than the baseline...
+MEMORY_THRESHOLD = 0.25 # ...or needs this much more peak memory...
+NOISE_SECONDS = 0.05 # ...and the difference is above these noise floors
+NOISE_MB = 5.0
+
+TURKISH_WORDS = np.array(["İstanbul", "Şule Çelik", "Ağrı Dağı", "Gümüşhane", "O'Brien", 'Ilık "su"', "ığdır",
+                          "Çağla'nın evi", "ÖĞRENCİ", "x"], dtype=object)
+
+
+def make_tall(rows, rng):
+    """Tall and narrow: many rows of a few typical columns."""
+    ints = rng.integers(0, 10**6, rows)
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'customer_no': ints,
+        'amount': rng.normal(0, 1000, rows).round(2),
+        'city': rng.choice(['Ankara', 'İzmir', 'Bursa', 'Konya'], rows),
+        'name': TURKISH_WORDS[rng.integers(0, len(TURKISH_WORDS), rows)],
+        'created': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 10**8, rows), unit='s'),
+    })
+
+
+def make_wide(rows, rng):
+    """Short and wide: a twentieth of the rows, 200 columns of mixed types."""
+    rows = max(rows // 20, 10)
+    columns = {}
+    for i in range(200):
+        kind = i % 4
+        if kind == 0:
+            columns[f'int_{i}'] = rng.integers(-1000, 1000, rows)
+        elif kind == 1:
+            columns[f'float_{i}'] = rng.normal(size=rows).round(3)
+        elif kind == 2:
+            columns[f'text_{i}'] = TURKISH_WORDS[rng.integers(0, len(TURKISH_WORDS), rows)]
+        else:
+            columns[f'code_{i}'] = np.char.add('K-', rng.integers(0, 10**5, rows).astype(str)).astype(object)
+    return pd.DataFrame(columns)
+
+
+def make_dates(rows, rng):
+    """Date-heavy: datetime cells, and dates and times written as text in several formats."""
+    stamps = pd.Timestamp('2000-01-01') + pd.to_timedelta(rng.integers(0, 7 * 10**8, rows), unit='s')
+    iso = pd.Series(stamps.strftime('%Y-%m-%d %H:%M:%S'), dtype=object)
+    iso[rng.random(rows) < 0.02] = 'not a date'
+    return pd.DataFrame({
+        'stamp': stamps,
+        'day': stamps.normalize(),
+        'iso_text': iso,
+        'day_text': pd.Series(stamps.strftime('%d.%m.%Y'), dtype=object),
+        'time_text': pd.Series(stamps.strftime('%H:%M:%S'), dtype=object),
+        'value': rng.integers(0, 100, rows),
+    })
+
+
+def make_text(rows, rng):
+    """Text-heavy: long values with quotes, double quotes, commas, newlines and Turkish characters."""
+    words = TURKISH_WORDS[rng.integers(0, len(TURKISH_WORDS), (rows, 8))]
+    sentences = pd.Series([' '.join(row) for row in words], dtype=object)
+    note = sentences.str.cat(pd.Series(np.where(rng.random(rows) < 0.1, ',\nikinci satır', ''), dtype=object))
+    return pd.DataFrame({
+        'title': TURKISH_WORDS[rng.integers(0, len(TURKISH_WORDS), rows)],
+        'body': sentences,
+        'note': note,
+        'long': sentences.str.repeat(6),
+        'quoted': "'" + sentences + "'",
+    })
+
+
+def make_nulls(rows, rng):
+    """Null-heavy: most cells empty, in every column type."""
+    frame = make_tall(rows, rng)
+    for column in frame.columns:
+        if column == 'id':
+            continue
+        frame[column] = frame[column].mask(rng.random(rows) < 0.8)
+    frame['always_empty'] = np.nan
+    return frame
+
+
+SHAPES = {'tall': make_tall, 'wide': make_wide, 'dates': make_dates, 'text': make_text, 'nulls': make_nulls}
+
+
+def input_file(data_dir, shape, size, file_format, seed=0):
+    """Generates the input file once, later runs reuse it (xlsx files are slow to write)."""
+    path = os.path.join(data_dir, f'{shape}_{size}_{seed}.{file_format}')
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        frame = SHAPES[shape](SIZES[size], np.random.default_rng(seed))
+        temporary = os.path.join(data_dir, f'{shape}_{size}_{seed}.partial.{file_format}') # Keeps the extension
+        if file_format == 'csv':
+            frame.to_csv(temporary, index=False)
+        else:
+            frame.to_excel(temporary, index=False, engine='openpyxl')
+        os.replace(temporary, path)
+    return path
+
+
+def measure(function):
+    """Runs function and returns its result, wall seconds and peak RSS in MB above the RSS before."""
+    gc.collect()
+    reset_peak_rss()
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    return result, seconds, max(peak_rss_mb() - before, 0.0)
+
+
+class GuiPhase:
+    """Builds the main window and shows the column table, the part of loading a file the user waits on."""
+    def __init__(self):
+        from PyQt5.QtWidgets import QApplication
+        import final
+        self.app = QApplication.instance() or QApplication([])
+        self.final = final
+
+    def __call__(self, column_specs):
+        window = self.final.ExcelToSqlConverter()
+        window.display_columns(column_specs)
+        window.show()
+        self.app.processEvents()
+        window.close()
+        window.deleteLater()
+        self.app.processEvents()
+
+
+def run_case(path, output_dir, repeat, gui, formatter=None):
+    """
+    Times every phase of converting one input file, the best of repeat runs per phase.
+    With formatter (a ParallelFormatter) generation is timed on its pool as well, as 'parallel'.
+    """
+    phases = {}
+
+    def record(name, function):
+        best = None
+        for _ in range(repeat):
+            result, seconds, peak_mb = measure(function)
+            if best is None or seconds < best[1]:
+                best = (result, seconds, peak_mb)
+        result, seconds, peak_mb = best
+        phases[name] = {'seconds': round(seconds, 4), 'peak_mb': round(peak_mb, 1)}
+        return result
+
+    output = os.path.join(output_dir, 'bench.sql')
+    preview, _ = record('preview', lambda: read_sample(path))
+    dataframe, _ = record('read', lambda: load_dataframe(path))
+    column_specs = record('infer', lambda: build_column_specs(dataframe, 'bench'))
+    if gui:
+        record('display', lambda: gui(column_specs))
+    record('generate', lambda: write_sql_file(output, 'bench', column_specs, dataframe_chunks(dataframe)))
+    if formatter is not None:
+        record('parallel', lambda: write_sql_file(output, 'bench', column_specs, dataframe_chunks(dataframe),
+                                                  formatter=formatter))
+    rows = len(dataframe)
+    del dataframe
+    stream_specs = build_column_specs(preview, 'bench', partial=True)
+    record('stream', lambda: write_sql_file(output, 'bench', stream_specs, iter_chunks(path)))
+    os.remove(output)
+    for name, measured in phases.items():
+        # The preview reads a fixed number of rows, its rate says nothing
+        measured['rows_per_s'] = round(rows / measured['seconds']) if name != 'preview' and measured['seconds'] else None
+    return {'rows': rows, 'bytes': os.path.getsize(path), 'phases': phases}
+
+
+def compare(results, baseline, time_threshold, memory_threshold):
+    """Lists the phases that are slower or need more memory than the baseline allows."""
+    regressions = []
+    for case, result in results.items():
+        base_case = baseline.get('cases', {}).get(case)
+        if base_case is None:
+            continue
+        for phase, measured in result['phases'].items():
+            base = base_case['phases'].get(phase)
+            if base is None:
+                continue
+            slower = measured['seconds'] - base['seconds']
+            if slower > NOISE_SECONDS and measured['seconds'] > base['seconds'] * (1 + time_threshold):
+                regressions.append(f"{case} {phase}: {measured['seconds']:.3f}s, baseline {base['seconds']:.3f}s "
+                                   f"(+{slower / base['seconds']:.0%})")
+            more = measured['peak_mb'] - base['peak_mb']
+            if more > NOISE_MB and measured['peak_mb'] > base['peak_mb'] * (1 + memory_threshold):
+                regressions.append(f"{case} {phase}: peak {measured['peak_mb']:.0f} MB, baseline "
+                                   f"{base['peak_mb']:.0f} MB (+{more:.0f} MB)")
+    return regressions
+
+
+def split_list(text, choices):
+    values = [value.strip() for value in text.split(',') if value.strip()]
+    unknown = [value for value in values if value not in choices]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown {', '.join(unknown)}, choose from {', '.join(choices)}")
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--shapes', type=lambda text: split_list(text, SHAPES), default=list(SHAPES),
+                        help=f"comma-separated, from {', '.join(SHAPES)} (default: all)")
+    parser.add_argument('--sizes', type=lambda text: split_list(text, SIZES), default=['small', 'medium'],
+                        help=f"comma-separated, from {', '.join(SIZES)} (default: small,medium)")
+    parser.add_argument('--formats', type=lambda text: split_list(text, FORMATS), default=FORMATS,
+                        help='comma-separated, from csv,xlsx (default: both)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per phase, the fastest counts (default: 1)')
+    parser.add_argument('--no-gui', action='store_true', help='skip the offscreen GUI phase')
+    parser.add_argument('--format-workers', type=int, default=1,
+                        help='also time generation with this many formatting processes, as the parallel phase; '
+                             'peak memory counts this process only (default: 1, off)')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help=f'generated inputs (default: {DEFAULT_DATA_DIR})')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--time-threshold', type=float, default=TIME_THRESHOLD,
+                        help=f'allowed slowdown per phase, 0.25 is 25%% (default: {TIME_THRESHOLD})')
+    parser.add_argument('--memory-threshold', type=float, default=MEMORY_THRESHOLD,
+                        help=f'allowed peak memory increase per phase (default: {MEMORY_THRESHOLD})')
+    args = parser.parse_args()
+
+    gui = None if args.no_gui else GuiPhase()
+    formatter = ParallelFormatter(args.format_workers) if args.format_workers > 1 else None
+    if formatter is not None:
+        list(formatter.executor.map(int, range(args.format_workers))) # Processes start before the first case is timed
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for shape in args.shapes:
+            for size in args.sizes:
+                for file_format in args.formats:
+                    case = f'{shape}/{size}/{file_format}'
+                    path = input_file(args.data_dir, shape, size, file_format)
+                    results[case] = result = run_case(path, output_dir, args.repeat, gui, formatter)
+                    print(f"{case}: {result['rows']:,} rows, {result['bytes'] / 2**20:.1f} MB")
+                    for phase, measured in result['phases'].items():
+                        rate = f"{measured['rows_per_s']:>12,} rows/s" if measured['rows_per_s'] else ' ' * 19
+                        print(f"  {phase:<9}{measured['seconds']:9.3f}s {rate} {measured['peak_mb']:8.1f} MB peak")
+
+    if formatter is not None:
+        formatter.close()
+    report = {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+              'machine': platform.machine(), 'cpus': os.cpu_count(), 'cases': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        baseline = {'cases': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update({key: value for key, value in report.items() if key != 'cases'})
+        baseline['cases'].update(results) # Cases not run this time keep their stored numbers
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}, run with --save-baseline first.')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.time_threshold, args.memory_threshold)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    compared = sum(case in baseline.get('cases', {}) for case in results)
+    print(f'{compared} of {len(results)} cases compared with the baseline, {len(regressions)} regressions.')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
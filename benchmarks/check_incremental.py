@@ -0,0 +1,77 @@
+"""
+Checks incremental re-imports against cases that once damaged the table: a key column read as
+text on one run and as numbers on the next must not DELETE keys that are still in the file, and
+values the first run's column types cannot store (300 in a TINYINT, A4 in a numeric key) must
+stop the run instead of being upserted.
+Exits with code 1 on a failed check.
+
+usage: python benchmarks/check_incremental.py
+"""
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from incremental import convert_file_incremental, manifest_filename # noqa: E402
+
+
+def run(directory, day, lines):
+    input_path = os.path.join(directory, 't.csv')
+    with open(input_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    output_filename = os.path.join(directory, 't.sql')
+    try:
+        counts, paths = convert_file_incremental(input_path, output_filename, ['code'], 't')
+    except ValueError as e:
+        print(f'{day}: {e}')
+        return None, None
+    with open(paths[0], encoding='utf-8') as f:
+        script = f.read()
+    print(f'{day}: {counts}')
+    return counts, script
+
+
+def deletes(script):
+    return re.findall(r'DELETE .*', script or '')
+
+
+def main():
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        # The key column is text on the first run and numbers on the second
+        run(directory, 'day 1', ['code,name', '1,a', '2,b', '3,c', 'X4,d'])
+        counts, script = run(directory, 'day 2', ['code,name', '1,a', '2,b', '3,c'])
+        if deletes(script) != ["DELETE FROM `t` WHERE `code` IN ('X4');"]:
+            failures.append('day 2 should delete exactly key X4:\n  ' + '\n  '.join(deletes(script)))
+        if counts is None or counts['changed'] or counts['new']:
+            failures.append(f'day 2 should have no new or changed rows, has {counts}')
+        os.remove(manifest_filename(os.path.join(directory, 't.sql')))
+
+        # qty is a TINYINT in the table the first run created
+        run(directory, 'day 1', ['code,qty', '1,5', '2,7'])
+        manifest = manifest_filename(os.path.join(directory, 't.sql'))
+        with open(manifest, 'rb') as f:
+            saved = f.read()
+        counts, script = run(directory, 'day 2', ['code,qty', '1,5', '2,300'])
+        if counts is not None:
+            failures.append(f'day 2 upserts 300 into a TINYINT column:\n  {script}')
+        if os.path.exists(os.path.join(directory, 't.sql')):
+            failures.append('day 2 leaves a script behind after stopping')
+        with open(manifest, 'rb') as f:
+            if f.read() != saved:
+                failures.append('day 2 replaced the manifest after stopping')
+        counts, script = run(directory, 'day 3', ['code,qty', '1,5', '2,9', '3,1'])
+        if counts != {'new': 1, 'changed': 1, 'unchanged': 1, 'deleted': 0}:
+            failures.append(f'day 3 should have 1 new, 1 changed and 1 unchanged row, has {counts}')
+        # An alphanumeric code in the TINYINT key column
+        counts, script = run(directory, 'day 4', ['code,qty', '1,5', '2,9', '3,1', 'A4,2'])
+        if counts is not None:
+            failures.append(f'day 4 upserts A4 into a TINYINT key column:\n  {script}')
+    for failure in failures:
+        print(f'FAILED: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
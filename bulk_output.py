@@ -0,0 +1,173 @@
+"""
+Bulk-load output as an alternative to INSERT statements, which the server has to parse row by row.
+'load-data' writes the rows to a tab-separated data file next to a script with the CREATE TABLE and
+a MySQL LOAD DATA LOCAL INFILE statement; 'copy' writes a PostgreSQL script with the CREATE TABLE
+(types mapped, see postgresql_type) and the rows inline after COPY ... FROM STDIN. The values are
+the ones the INSERT statements would hold, from the same column settings.
+"""
+import functools
+import os
+
+import pandas as pd
+
+from converter import (INFERENCE_SAMPLE_ROWS, ConversionCancelled, create_table_sql, format_column_values,
+                       format_columns, prepare_input, quote_name, write_values)
+from sql_output import SqlOutput
+
+OUTPUT_FORMATS = {
+    # Name: label shown to the user
+    'insert': 'INSERT statements',
+    'load-data': 'MySQL LOAD DATA + .tsv',
+    'copy': 'PostgreSQL COPY',
+}
+NULL_FIELD = '\\N'
+# Backslash escapes of the data file; MySQL reads \0 as NUL, PostgreSQL text cannot hold NUL at all
+TSV_ESCAPES = {
+    'mysql': str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'}),
+    'postgresql': str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': ''}),
+}
+
+
+def data_filename(output_filename):
+    """The data file loaded by the script: data.sql has data.tsv."""
+    return os.path.splitext(output_filename)[0] + '.tsv'
+
+
+def check_output_options(output_format, output_options):
+    """Raises ValueError for output options the bulk formats do not support."""
+    output_options = output_options or {}
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', use one of {', '.join(OUTPUT_FORMATS)}")
+    if output_format != 'insert' and output_options.get('max_part_bytes'):
+        raise ValueError('Only INSERT statements can be split into parts.')
+    if output_format == 'load-data' and output_options.get('compression'):
+        raise ValueError('LOAD DATA LOCAL INFILE reads uncompressed files, compression needs another output format.')
+
+
+def tsv_fields(series, data_type, row_dtype=None, dialect='mysql'):
+    """
+    Formats a column as data file fields: the values of its INSERT literals (see format_column_values)
+    without quotes, backslash, tab and line breaks escaped, and \\N for NULL.
+    """
+    literals = pd.Series(format_column_values(series, data_type, row_dtype))
+    quoted = literals.str.startswith("'").to_numpy()
+    null = (literals == 'NULL').to_numpy()
+    fields = literals.to_numpy(dtype=object, copy=True)
+    if quoted.any():
+        text = literals[quoted].str.slice(1, -1).str.replace("''", "'", regex=False)
+        fields[quoted] = text.str.translate(TSV_ESCAPES[dialect]).to_numpy(dtype=object)
+    fields[null] = NULL_FIELD
+    return fields
+
+
+def tsv_rows(dataframe, column_specs, stats=None, row_dtype=None, dialect='mysql'):
+    """One tab-separated data file line (without the line break) per row, see format_columns."""
+    format_column = functools.partial(tsv_fields, dialect=dialect)
+    columns = format_columns(dataframe, column_specs, stats, row_dtype, format_column)
+    if not columns:
+        return [''] * len(dataframe)
+    return ['\t'.join(fields) for fields in zip(*columns)]
+
+
+class TsvWriter:
+    """Writes data file lines for write_values, in place of an InsertWriter."""
+    def __init__(self, f):
+        self.f = f
+        self.rows_written = 0
+
+    def write(self, lines):
+        if lines:
+            self.f.write('\n'.join(lines) + '\n')
+            self.rows_written += len(lines)
+
+
+def load_data_sql(table_name, column_specs, data_path, insert_options=None):
+    """
+    The LOAD DATA LOCAL INFILE statement for data_path, named without its directory: run the script
+    from the data file's directory. DISABLE KEYS and unique_checks=0 of insert_options wrap it.
+    """
+    insert_options = insert_options or {}
+    table = quote_name(table_name)
+    path = os.path.basename(data_path).replace('\\', '\\\\').replace("'", "\\'")
+    names = ', '.join(quote_name(spec.name) for spec in column_specs)
+    lines = []
+    if insert_options.get('disable_unique_checks'):
+        lines.append('SET unique_checks=0;')
+    if insert_options.get('disable_keys'):
+        lines.append(f'ALTER TABLE {table} DISABLE KEYS;')
+    lines.extend([f"LOAD DATA LOCAL INFILE '{path}'", f'INTO TABLE {table}', 'CHARACTER SET utf8mb4',
+                  "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'", "LINES TERMINATED BY '\\n'", f'({names});'])
+    if insert_options.get('disable_keys'):
+        lines.append(f'ALTER TABLE {table} ENABLE KEYS;')
+    if insert_options.get('disable_unique_checks'):
+        lines.append('SET unique_checks=1;')
+    return '\n'.join(lines) + '\n'
+
+
+def write_bulk_sql(output_filename, table_name, column_specs, chunks, output_format, insert_options=None, warn=None,
+                   progress=None, cancel_event=None, output_options=None, stats=None, formatter=None):
+    """
+    Writes the 'load-data' or 'copy' output (see OUTPUT_FORMATS) for all chunks. 'copy' can be
+    compressed with output_options, neither can be split (see check_output_options). Of insert_options
+    only the DISABLE KEYS and unique_checks wrappers apply, to LOAD DATA. formatter formats the rows on a
+    process pool and stats gets the time spent per phase and column, see write_values.
+    Returns the number of rows written and the files written, the script first. On cancellation the
+    partial files are removed before ConversionCancelled is re-raised.
+    """
+    check_output_options(output_format, output_options)
+    output_options = output_options or {}
+    insert_options = insert_options or {}
+    if warn and any(insert_options.get(key) for key in ('max_rows', 'max_bytes', 'commit_every')):
+        warn('Rows per INSERT, Max KB per INSERT and COMMIT every N INSERTs only apply to INSERT statements.')
+    dialect = 'postgresql' if output_format == 'copy' else 'mysql'
+    outputs = []
+    try:
+        if output_format == 'copy':
+            script = data = SqlOutput(output_filename, compression=output_options.get('compression'))
+            outputs.append(script)
+            names = ', '.join(quote_name(spec.name, dialect) for spec in column_specs)
+            script.write(create_table_sql(table_name, column_specs, warn, dialect))
+            script.write(f'COPY {quote_name(table_name, dialect)} ({names}) FROM STDIN;\n')
+        else:
+            data = SqlOutput(data_filename(output_filename))
+            outputs.append(data)
+        writer = TsvWriter(data)
+        write_values(writer, chunks, column_specs, progress, cancel_event, stats, formatter,
+                     functools.partial(tsv_rows, dialect=dialect))
+        if output_format == 'copy':
+            script.write('\\.\n')
+        else:
+            # Written last, a script is only there with its complete data file
+            script = SqlOutput(output_filename)
+            outputs.insert(0, script)
+            script.write(create_table_sql(table_name, column_specs, warn))
+            script.write(load_data_sql(table_name, column_specs, data.paths[0], insert_options))
+    except ConversionCancelled:
+        for out in outputs:
+            out.abort()
+        raise
+    except BaseException:
+        for out in outputs:
+            out.close()
+        raise
+    for out in outputs:
+        out.close()
+    paths = [path for out in outputs for path in out.paths]
+    if stats is not None:
+        stats.info.update({'output_files': paths, 'rows_written': writer.rows_written,
+                           'bytes_written': sum(out.bytes_written for out in outputs)})
+    return writer.rows_written, paths
+
+
+def convert_file_bulk(input_path, output_filename, output_format, table_name=None, stream=False, insert_options=None,
+                      warn=None, sample_rows=INFERENCE_SAMPLE_ROWS, engine=None, encoding=None, decode_errors='strict',
+                      output_options=None, stats=None, profiles=None, formatter=None):
+    """
+    Converts one input file to the output_format files with the suggested (or saved, see profiles)
+    column settings, see prepare_input and write_bulk_sql.
+    """
+    table_name, column_specs, chunks = prepare_input(input_path, table_name, stream, sample_rows, engine=engine,
+                                                     encoding=encoding, decode_errors=decode_errors, warn=warn,
+                                                     stats=stats, profiles=profiles)
+    return write_bulk_sql(output_filename, table_name, column_specs, chunks, output_format, insert_options, warn,
+                          output_options=output_options, stats=stats, formatter=formatter)
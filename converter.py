@@ -0,0 +1,1319 @@
+"""
+GUI-free conversion engine: reading input files, column naming and type suggestion,
+and writing the CREATE TABLE and INSERT statements. Used by the GUI (final.py) and the CLI (cli.py).
+"""
+import codecs
+import contextlib
+import datetime
+import importlib.util
+import os
+import shutil
+import time
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from sql_output import SPLIT_STATEMENT_BYTES, SqlOutput, output_filename_for
+
+# Helper function to clean column names and table name
+def clean_name(name):
+    """
+    Converts names to lowercase and replaces non-English characters.
+    Also replaces spaces with underscores and removes invalid characters for SQL identifiers.
+    """
+    if not isinstance(name, str):
+        name = str(name) # Ensure name is a string
+
+    name = name.lower()
+    # Simple replacement for common Turkish characters
+    replacements = {
+        'ç': 'c', 'ğ': 'g', 'ı': 'i', 'ö': 'o', 'ş': 's', 'ü': 'u',
+        'Ç': 'C', 'Ğ': 'G', 'İ': 'I', 'Ö': 'O', 'Ş': 'S', 'Ü': 'U',
+        ' ': '_' # Replace spaces with underscores
+    }
+    for original, replacement in replacements.items():
+        name = name.replace(original, replacement)
+    # Remove any characters that are not alphanumeric or underscore
+    name = ''.join(e for e in name if e.isalnum() or e == '_')
+    # Ensure it doesn't start with a number (MySQL identifiers can't start with a digit)
+    if name and name[0].isdigit():
+        name = '_' + name
+    return name
+
+# MySQL types offered for every column
+DATA_TYPES = ['VARCHAR(255)', 'INT(11)', 'TEXT', 'LONGTEXT', 'DATE', 'TIME', 'DATETIME', 'ENUM', 'BIGINT',
+              'TINYINT', 'SMALLINT', 'DECIMAL(10,2)']
+
+@dataclass(slots=True)
+class ColumnSpec:
+    """Settings of one output column, as edited in the GUI column table."""
+    name: str # Cleaned (or user edited) MySQL column name
+    original_name: object # Column label in the input file
+    data_type: str = 'VARCHAR(255)'
+    allow_null: bool = True
+    default_value: str = ''
+    enum_values_text: str = '' # Comma-separated ENUM values
+
+# strftime formats used for the temporal MySQL types
+TEMPORAL_FORMATS = {
+    'DATE': '%Y-%m-%d',
+    'TIME': '%H:%M:%S',
+    'DATETIME': '%Y-%m-%d %H:%M:%S',
+}
+
+# Integer types, smallest first, with their signed value ranges
+INT_RANGES = [
+    ('TINYINT', -128, 127),
+    ('SMALLINT', -32768, 32767),
+    ('INT(11)', -2147483648, 2147483647),
+    ('BIGINT', -9223372036854775808, 9223372036854775807),
+]
+
+def is_int_type(data_type):
+    """Returns True for the MySQL types whose values are written as bare integers."""
+    return data_type.startswith('INT') or data_type.split('(')[0] in ('TINYINT', 'SMALLINT', 'MEDIUMINT', 'BIGINT')
+
+def _int_literal(value):
+    # Element-wise fallback, same rules as the original per-cell loop
+    try:
+        return str(int(value))
+    except (ValueError, TypeError, OverflowError):
+        return 'NULL'
+
+def _temporal_literal(value, fmt):
+    # Element-wise fallback for values the vectorized parser could not handle
+    if isinstance(value, datetime.time) and fmt == TEMPORAL_FORMATS['TIME']:
+        return f"'{value.strftime(fmt)}'" # Excel time cells, pd.to_datetime cannot convert them
+    try:
+        return f"'{pd.to_datetime(value).strftime(fmt)}'"
+    except Exception:
+        return 'NULL'
+
+def _as_strings(series):
+    """Converts a series to str(value) for every element, like the per-cell loop did."""
+    if pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_timedelta64_dtype(series):
+        # astype(str) drops the time part of midnight timestamps, str(Timestamp) keeps it
+        return series.astype(object).map(str)
+    return series.astype(str)
+
+def _int_literals(series):
+    if pd.api.types.is_bool_dtype(series):
+        return series.astype(np.int64).astype(str)
+    if pd.api.types.is_integer_dtype(series):
+        return series.astype(str)
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy(dtype=float)
+        # int() truncates towards zero; values outside int64 take the slow path
+        if np.isfinite(values).all() and (np.abs(values) < 2**63).all():
+            return pd.Series(np.trunc(values).astype(np.int64), index=series.index).astype(str)
+    return series.map(_int_literal)
+
+def _temporal_literals(series, data_type):
+    fmt = TEMPORAL_FORMATS[data_type]
+    if pd.api.types.is_datetime64_any_dtype(series):
+        parsed = series
+    else:
+        try:
+            if pd.api.types.is_numeric_dtype(series):
+                parsed = pd.to_datetime(series, errors='coerce')
+            else:
+                # 'mixed' infers the format per element, like pd.to_datetime(value) does
+                parsed = pd.to_datetime(series, errors='coerce', format='mixed')
+        except Exception:
+            return series.map(lambda value: _temporal_literal(value, fmt))
+    literals = ("'" + parsed.dt.strftime(fmt) + "'").astype(object)
+    unparsed = parsed.isna()
+    if unparsed.any():
+        literals[unparsed] = series[unparsed].map(lambda value: _temporal_literal(value, fmt))
+    return literals
+
+def _format_literals(values, data_type):
+    if is_int_type(data_type):
+        return _int_literals(values)
+    if data_type in TEMPORAL_FORMATS:
+        return _temporal_literals(values, data_type)
+    # Strings, ENUM and any other type: escape single quotes and wrap in quotes
+    return "'" + _as_strings(values).str.replace("'", "''", regex=False) + "'"
+
+def _dictionary_literals(values, data_type):
+    """
+    Formats every distinct value once and picks each row's literal from that small table.
+    Returns None for columns with too many distinct values to gain from it.
+    """
+    sample = values.iloc[np.linspace(0, len(values) - 1, DICTIONARY_MIN_ROWS).astype(np.int64)]
+    if sample.nunique() > DICTIONARY_MIN_ROWS * DICTIONARY_MAX_RATIO:
+        return None # Mostly distinct values, skip hashing the whole column
+    codes, uniques = pd.factorize(values)
+    if len(uniques) > len(values) * DICTIONARY_MAX_RATIO:
+        return None
+    table = _format_literals(pd.Series(uniques), data_type).to_numpy(dtype=object)
+    return pd.Series(table[codes], index=values.index)
+
+DICTIONARY_MIN_ROWS = 1000 # Shorter columns are formatted directly
+DICTIONARY_MAX_RATIO = 0.5 # Distinct values per row up to which a column is formatted through its distinct values
+
+def format_column_values(series, data_type, row_dtype=None):
+    """
+    Formats a whole column as SQL literals in one pass.
+    Missing values become NULL, the rest are formatted according to the selected MySQL type.
+    Text and datetime columns with few distinct values format each distinct value only once.
+    row_dtype is the dtype iterrows() would upcast each row to, kept for byte-identical output.
+    """
+    if row_dtype is not None and row_dtype != object and series.dtype != row_dtype:
+        series = series.astype(row_dtype)
+
+    result = np.full(len(series), 'NULL', dtype=object)
+    mask = series.notna().to_numpy()
+    values = series[mask]
+    if values.empty:
+        return result
+
+    literals = None
+    # Only all-string and datetime64 columns: factorize would merge 1, 1.0 and True, or 0.0 and -0.0,
+    # which format differently. Integer literals are cheap to build directly.
+    if (not is_int_type(data_type) and len(values) >= DICTIONARY_MIN_ROWS
+            and (pd.api.types.is_string_dtype(values) or pd.api.types.is_datetime64_any_dtype(values))):
+        literals = _dictionary_literals(values, data_type)
+    if literals is None:
+        literals = _format_literals(values, data_type)
+
+    result[mask] = literals.to_numpy(dtype=object)
+    return result
+
+def format_columns(dataframe, column_specs, stats=None, row_dtype=None, format_column=format_column_values):
+    """
+    Formats every column of column_specs with format_column(series, data_type, row_dtype).
+    row_dtype defaults to the upcast dtype of the dataframe's rows; pass the one of the whole
+    chunk when dataframe holds only some of its columns.
+    stats (an instrumentation.RunStats) gets the formatting time of every column.
+    """
+    if row_dtype is None:
+        # iterrows() upcasts every row to the common dtype of the frame, e.g. ints to floats
+        row_dtype = dataframe.iloc[:0].values.dtype
+    if stats is None:
+        return [format_column(dataframe[spec.original_name], spec.data_type, row_dtype) for spec in column_specs]
+    columns = []
+    for spec in column_specs:
+        wall, cpu = time.perf_counter(), time.process_time()
+        columns.append(format_column(dataframe[spec.original_name], spec.data_type, row_dtype))
+        stats.add_column(spec.name, 'format', time.perf_counter() - wall, time.process_time() - cpu)
+    return columns
+
+def format_rows(dataframe, column_specs, stats=None, row_dtype=None):
+    """Builds the '(v1, v2, ...)' VALUES tuple for every row of the dataframe, see format_columns."""
+    if not column_specs:
+        return ['()'] * len(dataframe)
+    columns = format_columns(dataframe, column_specs, stats, row_dtype)
+    return ['(' + ', '.join(row_values) + ')' for row_values in zip(*columns)]
+
+STREAM_CHUNK_ROWS = 50000 # Rows read, formatted and written at a time in streaming mode
+STREAM_SAMPLE_ROWS = 10000 # Rows taken from the start of the file for type inference in streaming mode
+ENCODING_SAMPLE_BYTES = 1 << 18 # Bytes read from the start, middle and end of a CSV to detect its encoding
+# ĞİŞğış in the Turkish code pages, the rarely used ÐÝÞðýþ in cp1252/latin1
+TURKISH_BYTES = frozenset(b'\xd0\xdd\xde\xf0\xfd\xfe')
+CSV_ENCODINGS = ['utf-8', 'utf-8-sig', 'utf-16', 'cp1254', 'iso-8859-9', 'cp1252', 'latin1'] # Offered in the UI
+DECODE_ERROR_POLICIES = ['strict', 'replace', 'report']
+
+def _encoding_sample(file_path):
+    # Up to three blocks: the start, the middle and the end of the file
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        blocks = [f.read(ENCODING_SAMPLE_BYTES)]
+        for offset in (size // 2, size - ENCODING_SAMPLE_BYTES):
+            if offset >= len(blocks[0]):
+                f.seek(offset)
+                blocks.append(f.read(ENCODING_SAMPLE_BYTES))
+    return blocks
+
+def _is_utf8(block, at_start):
+    if not at_start:
+        # The block may start inside a character, skip its (at most three) continuation bytes
+        skip = 0
+        while skip < min(3, len(block)) and 0x80 <= block[skip] < 0xC0:
+            skip += 1
+        block = block[skip:]
+    try:
+        # Not final: a character cut at the end of the block is held back, not an error
+        codecs.getincrementaldecoder('utf-8')().decode(block, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def sniff_encoding(file_path):
+    """
+    Detects the encoding of a CSV file from a bounded byte sample (see _encoding_sample), without parsing it.
+    A BOM decides first, then UTF-8 validity. Other files get a single-byte code page: the Turkish cp1254
+    (or iso-8859-9 for bytes cp1254 leaves undefined) when Ğ, İ, Ş, ğ, ı or ş bytes occur, cp1252 or
+    latin1 otherwise. Returns a Python codec name.
+    """
+    blocks = _encoding_sample(file_path)
+    head = blocks[0]
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)): # Before UTF-16, the LE BOMs share a prefix
+        return 'utf-32'
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    if all(_is_utf8(block, i == 0) for i, block in enumerate(blocks)):
+        return 'utf-8'
+    sample = b''.join(blocks)
+    candidates = ['cp1254', 'iso-8859-9'] if TURKISH_BYTES & set(sample) else ['cp1252', 'latin1']
+    for encoding in candidates:
+        try:
+            sample.decode(encoding)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return candidates[-1] # Unreachable, iso-8859-9 and latin1 decode every byte
+
+def undecodable_lines(file_path, encoding):
+    """
+    Yields the numbers of the CSV lines that do not decode with encoding, the header is line 1.
+    Lines are split at b'\\n', so this fits UTF-8 and the single-byte code pages, not UTF-16/32.
+    """
+    with open(file_path, 'rb') as f:
+        for number, line in enumerate(f, start=1):
+            try:
+                line.decode(encoding)
+            except UnicodeDecodeError:
+                yield number
+
+def check_decoding(file_path, encoding, warn, limit=10):
+    """For the 'report' policy: warns about the lines whose undecodable bytes were replaced."""
+    numbers = []
+    count = 0
+    for number in undecodable_lines(file_path, encoding):
+        count += 1
+        if len(numbers) < limit:
+            numbers.append(str(number))
+    if count and warn:
+        more = f' and {count - len(numbers)} more' if count > len(numbers) else ''
+        warn(f"{count} lines of {os.path.basename(file_path)} are not valid {encoding}, their undecodable bytes "
+             f"were replaced with U+FFFD: line {', '.join(numbers)}{more}.")
+    return count
+
+def _decode_error(file_path, encoding, error):
+    # The parser's byte position is relative to its buffer, so find the first bad line instead
+    number = next(undecodable_lines(file_path, encoding), None)
+    where = f'line {number}' if number else 'the file'
+    return ValueError(f"{os.path.basename(file_path)}: {where} is not valid {encoding} ({error.reason}). "
+                      f"Choose another encoding, or the replace or report decode error policy.")
+
+def _pandas_encoding_errors(decode_errors):
+    # 'report' reads like 'replace', check_decoding lists the affected lines
+    return 'strict' if decode_errors == 'strict' else 'replace'
+
+def _excel_header_names(header):
+    """
+    Names header cells the way pandas.read_excel does:
+    'Unnamed: i' for blank cells and '.1', '.2' suffixes for duplicates.
+    """
+    names = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = f'Unnamed: {i}' if value is None else value
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        if count:
+            new_name = f'{name}.{count}'
+            while new_name in seen:
+                count += 1
+                new_name = f'{name}.{count}'
+            seen[name] = count + 1
+            seen[new_name] = 1
+            name = new_name
+        names.append(name)
+    return names
+
+def _trimmed_length(row):
+    # Length of a row without its trailing empty cells
+    length = len(row)
+    while length and row[length - 1] is None:
+        length -= 1
+    return length
+
+def _xlsx_width(sheet, header):
+    # pandas sizes the frame from its widest row, trailing empty cells dropped, so columns with a blank
+    # header but values below it are kept. Only when the header does not span the sheet's used range
+    # (or the sheet does not record it) do the rows have to be scanned for their width first.
+    width = _trimmed_length(header)
+    if width == len(header) and sheet.max_column is not None:
+        return width
+    for row in sheet.iter_rows(min_row=2, values_only=True):
+        width = max(width, _trimmed_length(row))
+    return width
+
+def _iter_xlsx_chunks(file_path, chunksize, sheet_name=None):
+    # openpyxl's read-only mode parses the sheet lazily, one row at a time
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0] if sheet_name is None else workbook[sheet_name]
+        rows = sheet.iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        width = _xlsx_width(sheet, header)
+        columns = _excel_header_names((header + [None] * width)[:width])
+        width = len(columns)
+        blank_row = (None,) * width
+        batch = []
+        blank_rows = 0 # Blank rows seen since the last row with a value
+        yielded = False
+        for row in rows:
+            if all(value is None for value in row):
+                blank_rows += 1
+                continue
+            # Like pandas, blank rows between rows with values are kept as all-missing rows,
+            # only the ones at the end of the sheet are dropped
+            batch.extend([blank_row] * blank_rows)
+            blank_rows = 0
+            row = tuple(row[:width])
+            batch.append(row + (None,) * (width - len(row)))
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=columns)
+                yielded = True
+                batch = []
+        if batch or not yielded:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+def iter_chunks(file_path, chunksize=STREAM_CHUNK_ROWS, encoding=None, sheet_name=None, decode_errors='strict'):
+    """
+    Yields the input file as DataFrames of at most chunksize rows without loading it whole.
+    CSV files use read_csv's chunked reader, xlsx files openpyxl's read-only row iterator.
+    sheet_name picks a workbook sheet, None is the first one. A CSV is read with encoding
+    (detected when None) and the decode_errors policy, see DECODE_ERROR_POLICIES.
+    """
+    if file_path.endswith('.csv'):
+        encoding = encoding or sniff_encoding(file_path)
+        try:
+            with pd.read_csv(file_path, chunksize=chunksize, encoding=encoding,
+                             encoding_errors=_pandas_encoding_errors(decode_errors)) as reader:
+                yield from reader
+        except UnicodeDecodeError as e:
+            raise _decode_error(file_path, encoding, e) from e
+    elif file_path.lower().endswith(('.xlsx', '.xlsm')):
+        yield from _iter_xlsx_chunks(file_path, chunksize, sheet_name)
+    else:
+        # There is no row-by-row reader for .xls, read it once and hand it out in slices
+        yield from dataframe_chunks(pd.read_excel(file_path, sheet_name=sheet_name or 0), chunksize)
+
+def dataframe_chunks(dataframe, chunksize=STREAM_CHUNK_ROWS):
+    """Hands out an already loaded DataFrame in slices, so progress can be reported per slice."""
+    for start in range(0, max(len(dataframe), 1), chunksize):
+        yield dataframe.iloc[start:start + chunksize]
+
+def estimate_row_count(file_path, sheet_name=None):
+    """
+    Estimates the number of data rows without parsing the file, for progress reporting.
+    CSV lines are counted (quoted line breaks count too), xlsx files report their sheet dimension.
+    Returns None when no estimate is available.
+    """
+    if file_path.endswith('.csv'):
+        lines = 0
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                lines += block.count(b'\n')
+        return max(lines - 1, 0) # Minus the header line
+    if file_path.lower().endswith(('.xlsx', '.xlsm')):
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            sheet = workbook.worksheets[0] if sheet_name is None else workbook[sheet_name]
+            max_row = sheet.max_row
+        finally:
+            workbook.close()
+        return max_row - 1 if max_row else None
+    return None
+
+def read_sample(file_path, sample_rows=STREAM_SAMPLE_ROWS, sheet_name=None, encoding=None, decode_errors='strict'):
+    """
+    Reads the first sample_rows rows of the file for type inference.
+    Returns the sample and the CSV encoding, detected when None (None for Excel files).
+    """
+    if file_path.endswith('.csv'):
+        encoding = encoding or sniff_encoding(file_path)
+        try:
+            return pd.read_csv(file_path, nrows=sample_rows, encoding=encoding,
+                               encoding_errors=_pandas_encoding_errors(decode_errors)), encoding
+        except UnicodeDecodeError as e:
+            raise _decode_error(file_path, encoding, e) from e
+    if not file_path.lower().endswith(('.xlsx', '.xlsm')):
+        return pd.read_excel(file_path, sheet_name=sheet_name or 0, nrows=sample_rows), None
+    return next(iter_chunks(file_path, chunksize=sample_rows, sheet_name=sheet_name)), None
+
+class InsertWriter:
+    """
+    Writes VALUES tuples as INSERT statements. A new statement with its own INSERT INTO header
+    is started whenever max_rows or max_bytes (keep it under the server's max_allowed_packet)
+    would be exceeded. Without limits everything goes into a single statement.
+    Optional wrappers: COMMIT every commit_every statements, DISABLE/ENABLE KEYS and unique_checks=0.
+    With update_columns the statements are upserts that overwrite these columns of existing rows
+    (ON DUPLICATE KEY UPDATE). f is a SqlOutput. When it is split, a part is closed before a statement of up to max_bytes would
+    overflow it: the wrappers are ended there and started again in the new part, so every part loads on its own.
+    """
+    def __init__(self, f, table_name, column_names, max_rows=None, max_bytes=None,
+                 commit_every=None, disable_keys=False, disable_unique_checks=False, update_columns=None):
+        self.f = f
+        self.table_name = table_name
+        self.header = f"INSERT INTO `{table_name}` ({', '.join([f'`{c}`' for c in column_names])}) VALUES\n"
+        self.footer = ''
+        if update_columns:
+            self.footer = "\nON DUPLICATE KEY UPDATE " + ", ".join([f"`{c}`=VALUES(`{c}`)" for c in update_columns])
+        self.header_bytes = len((self.header + self.footer).encode('utf-8')) # Counted as part of every statement
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.commit_every = commit_every
+        self.disable_keys = disable_keys
+        self.disable_unique_checks = disable_unique_checks
+        self.statements = 0 # Finished statements
+        self.part_statements = 0 # Finished statements in the current part file
+        self.rows_written = 0
+        self.statement_rows = 0 # Rows in the statement currently being written
+        self.statement_bytes = 0
+
+    def begin(self):
+        if self.disable_unique_checks:
+            self.f.write("SET unique_checks=0;\n")
+        if self.commit_every:
+            self.f.write("SET autocommit=0;\n")
+        if self.disable_keys:
+            self.f.write(f"ALTER TABLE `{self.table_name}` DISABLE KEYS;\n")
+
+    def write(self, values_list):
+        # Every tuple is followed by ",\n" or ";\n", hence the + 2
+        sizes = [len(v.encode('utf-8')) + 2 for v in values_list] if self.max_bytes else None
+        start = 0
+        while start < len(values_list):
+            if not self.statement_rows:
+                if self.part_statements and not self.f.fits(self.max_bytes or 0):
+                    self._next_part()
+                self.f.write(self.header)
+                self.statement_bytes = self.header_bytes
+            end = len(values_list)
+            if self.max_rows:
+                end = min(end, start + self.max_rows - self.statement_rows)
+            if sizes is not None:
+                budget = self.max_bytes - self.statement_bytes
+                i = start
+                # A single tuple larger than max_bytes still gets a statement of its own
+                while i < end and (sizes[i] <= budget or not self.statement_rows and i == start):
+                    budget -= sizes[i]
+                    i += 1
+                self.statement_bytes = self.max_bytes - budget
+                end = i
+            if end > start:
+                if self.statement_rows:
+                    self.f.write(",\n") # Continue the current INSERT statement
+                self.f.write(",\n".join(values_list[start:end]))
+                self.statement_rows += end - start
+                self.rows_written += end - start
+                start = end
+            if start < len(values_list):
+                self._end_statement() # Statement is full, the rest goes into a new one
+
+    def write_statement(self, sql):
+        """Writes a statement of its own, e.g. a DELETE, after the rows written so far."""
+        if self.statement_rows:
+            self._end_statement()
+        if self.part_statements and not self.f.fits(len(sql.encode('utf-8')) + 2):
+            self._next_part()
+        self.f.write(sql + ";\n")
+        self._statement_done()
+
+    def _end_statement(self):
+        self.f.write(self.footer + ";\n")
+        self.statement_rows = 0
+        self._statement_done()
+
+    def _statement_done(self):
+        self.statements += 1
+        self.part_statements += 1
+        if self.commit_every and self.statements % self.commit_every == 0:
+            self.f.write("COMMIT;\n")
+
+    def _next_part(self):
+        self._end_wrappers()
+        self.f.new_part()
+        self.part_statements = 0
+        self.begin()
+
+    def finish(self):
+        if self.statement_rows:
+            self._end_statement()
+        self._end_wrappers()
+
+    def _end_wrappers(self):
+        if self.disable_keys:
+            self.f.write(f"ALTER TABLE `{self.table_name}` ENABLE KEYS;\n")
+        if self.commit_every:
+            if self.statements % self.commit_every:
+                self.f.write("COMMIT;\n")
+            self.f.write("SET autocommit=1;\n")
+        if self.disable_unique_checks:
+            self.f.write("SET unique_checks=1;\n")
+
+class ConversionCancelled(Exception):
+    """Raised when a conversion is stopped through its cancel event."""
+
+def _phase(stats, name):
+    # stats.phase(name), or a no-op without instrumentation
+    return stats.phase(name) if stats is not None else contextlib.nullcontext({})
+
+def _timed_chunks(chunks, stats):
+    # Time spent getting the next chunk: reading and parsing when streaming
+    chunks = iter(chunks)
+    while True:
+        wall, cpu = time.perf_counter(), time.process_time()
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        stats.add('read chunks', time.perf_counter() - wall, time.process_time() - cpu, rows=len(chunk))
+        yield chunk
+
+def write_values(writer, chunks, column_specs, progress=None, cancel_event=None, stats=None, formatter=None,
+                 row_function=format_rows):
+    """
+    Formats the VALUES tuples of each chunk and hands them to the InsertWriter right away,
+    so only one chunk is held in memory. Returns the number of rows written. Other writers take
+    the rows row_function (with the arguments of format_rows) makes, e.g. lines of a data file.
+    progress is called with the rows written so far after every chunk; setting cancel_event
+    (a threading.Event) stops before the next chunk with ConversionCancelled.
+    stats (an instrumentation.RunStats) gets the time spent reading, formatting and writing chunks.
+    With formatter (a parallel_format.ParallelFormatter) the chunks are formatted on its process
+    pool, a few chunks ahead of the one being written.
+    """
+    if stats is not None:
+        chunks = _timed_chunks(chunks, stats)
+    if formatter is not None:
+        values_lists = formatter.format_chunks(chunks, column_specs, stats, row_function)
+    else:
+        values_lists = _formatted_chunks(chunks, column_specs, cancel_event, stats, row_function)
+    try:
+        with stats.tracing() if stats is not None else contextlib.nullcontext():
+            for values_list in values_lists:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ConversionCancelled()
+                if stats is None:
+                    writer.write(values_list)
+                else:
+                    wall, cpu = time.perf_counter(), time.process_time()
+                    written = writer.f.bytes_written
+                    writer.write(values_list)
+                    stats.add('write', time.perf_counter() - wall, time.process_time() - cpu,
+                              rows=len(values_list), nbytes=writer.f.bytes_written - written)
+                if progress:
+                    progress(writer.rows_written)
+    finally:
+        values_lists.close() # Chunks formatted ahead are dropped at once
+    return writer.rows_written
+
+def _formatted_chunks(chunks, column_specs, cancel_event, stats, row_function):
+    # The VALUES tuples of each chunk, formatted on this thread
+    for chunk in chunks:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ConversionCancelled()
+        if stats is None:
+            yield row_function(chunk, column_specs)
+        else:
+            wall, cpu = time.perf_counter(), time.process_time()
+            values_list = row_function(chunk, column_specs, stats)
+            stats.add('format', time.perf_counter() - wall, time.process_time() - cpu, rows=len(chunk))
+            yield values_list
+
+READER_ENGINES = {
+    # Name shown to the user: (pandas engine argument, module it needs, file types it reads)
+    'pandas': (None, None, None), # pandas' default: the C parser for CSV, openpyxl (read-only) for xlsx
+    'pyarrow': ('pyarrow', 'pyarrow', ('.csv',)),
+    'calamine': ('calamine', 'python_calamine', ('.xls', '.xlsx', '.xlsm')),
+}
+
+def reader_engine(file_path, engine='pandas'):
+    """
+    Returns the pandas engine argument for reading file_path with the named reader (see READER_ENGINES).
+    Files the reader does not handle, e.g. a CSV with calamine, get None, pandas' default.
+    Raises ImportError when the reader's package is not installed.
+    """
+    pandas_engine, module, extensions = READER_ENGINES[engine or 'pandas']
+    if extensions and not file_path.lower().endswith(extensions):
+        return None
+    if module and importlib.util.find_spec(module) is None:
+        raise ImportError(f"The {engine} reader needs the {module.replace('_', '-')} package installed.")
+    return pandas_engine
+
+def load_dataframe(file_path, sheet_name=None, usecols=None, engine=None, encoding=None, decode_errors='strict'):
+    """
+    Reads the whole input file, or one sheet of a workbook (None is the first), into a DataFrame.
+    usecols limits the read to these column positions, engine is a pandas engine (see reader_engine).
+    A CSV is parsed once, with encoding or the one sniff_encoding detects.
+    Returns the DataFrame and the CSV encoding (None for Excel files).
+    """
+    if file_path.endswith('.csv'):
+        encoding = encoding or sniff_encoding(file_path)
+        # pandas' pyarrow engine takes no column positions: it reads every column and the used ones are picked after
+        positions = usecols if engine == 'pyarrow' else None
+        try:
+            dataframe = pd.read_csv(file_path, encoding=encoding,
+                                    encoding_errors=_pandas_encoding_errors(decode_errors),
+                                    usecols=None if positions is not None else usecols, engine=engine)
+        except UnicodeDecodeError as e:
+            raise _decode_error(file_path, encoding, e) from e
+        if positions is not None:
+            dataframe = dataframe.iloc[:, positions]
+        return dataframe, encoding
+    # Assume Excel file (.xls or .xlsx)
+    # pandas requires xlrd for .xls files and openpyxl for .xlsx files
+    return pd.read_excel(file_path, sheet_name=sheet_name or 0, usecols=usecols, engine=engine), None
+
+def load_columns(file_path, preview_columns, column_specs, sheet_name=None, engine=None, encoding=None,
+                 decode_errors='strict'):
+    """
+    The full read after a header-and-sample preview: reads only the columns column_specs use.
+    preview_columns are the column names of the preview, the columns are picked by their position
+    there and keep those names, so duplicate headers ('a', 'a.1') stay matched to their specs.
+    Returns the DataFrame and the CSV encoding.
+    """
+    used = set(spec.original_name for spec in column_specs)
+    positions = [i for i, column in enumerate(preview_columns) if column in used]
+    dataframe, encoding = load_dataframe(file_path, sheet_name, positions, engine, encoding, decode_errors)
+    dataframe.columns = [preview_columns[i] for i in positions]
+    return dataframe, encoding
+
+def is_workbook(file_path):
+    return file_path.lower().endswith(('.xls', '.xlsx', '.xlsm'))
+
+def sheet_names(file_path):
+    """Lists the sheets of a workbook in workbook order, without parsing their cells."""
+    with pd.ExcelFile(file_path) as workbook:
+        return list(workbook.sheet_names)
+
+def sheet_table_names(names):
+    """
+    Derives one table name per sheet with clean_name. Sheets whose name cleans to nothing become
+    sheet_<position>, names that clash after cleaning get _2, _3, ... suffixes.
+    """
+    table_names = []
+    for position, name in enumerate(names, start=1):
+        base = clean_name(name) or f'sheet_{position}'
+        table_name = base
+        suffix = 2
+        while table_name in table_names:
+            table_name = f'{base}_{suffix}'
+            suffix += 1
+        table_names.append(table_name)
+    return table_names
+
+INFERENCE_SAMPLE_ROWS = 10000 # Rows looked at to decide the type of a text column
+DATE_RATIO_THRESHOLD = 0.8 # Share of values that must parse as dates for a DATE/DATETIME suggestion
+DATE_RATIO_AMBIGUOUS = (0.7, 0.9) # Sample ratios this close to the threshold are re-checked on the full column
+DATE_MAX_LENGTH = 40 # Longer values are not taken for dates, e.g. 'Wednesday, September 15, 2021 13:45:00'
+MAX_DECIMAL_SCALE = 10
+MAX_DECIMAL_PRECISION = 65 # MySQL limit for DECIMAL(p,s)
+MAX_VARCHAR_LENGTH = 255 # Longer text gets TEXT/LONGTEXT so rows stay within MySQL's row size limit
+MAX_TEXT_LENGTH = 16383 # Characters that always fit into TEXT's 65535 bytes
+ENUM_MAX_VALUES = 20 # Text columns with at most this many distinct values are suggested as ENUM...
+ENUM_MIN_ROWS = 100 # ...if they have at least this many values, so the distinct ones are likely all there
+
+def stratified_sample(series, sample_rows):
+    """Takes evenly spaced rows over the whole series, so the start, middle and end are all represented."""
+    if len(series) <= sample_rows:
+        return series
+    positions = np.linspace(0, len(series) - 1, sample_rows).astype(np.int64)
+    return series.iloc[positions]
+
+def _int_type_for_range(minimum, maximum):
+    for data_type, low, high in INT_RANGES:
+        if minimum >= low and maximum <= high:
+            return data_type
+    return 'BIGINT'
+
+def _decimal_type(values):
+    """Returns DECIMAL(p,s) for floats with few decimal places, None if they need more than MAX_DECIMAL_SCALE."""
+    for scale in range(1, MAX_DECIMAL_SCALE + 1):
+        scaled = values * 10**scale
+        if np.allclose(scaled, np.round(scaled), rtol=0, atol=1e-6):
+            break
+    else:
+        return None
+    max_abs = np.abs(values).max()
+    int_digits = len(str(int(max_abs))) if max_abs >= 1 else 1
+    if int_digits + scale > MAX_DECIMAL_PRECISION:
+        return None
+    return f'DECIMAL({int_digits + scale},{scale})'
+
+def _numeric_type(series):
+    # Vectorized checks over the whole column, they are cheap for numeric dtypes
+    if pd.api.types.is_bool_dtype(series):
+        return 'TINYINT'
+    values = series.to_numpy(dtype=float)
+    if not np.isfinite(values).all():
+        return None
+    if pd.api.types.is_integer_dtype(series) or (values == np.trunc(values)).all():
+        return _int_type_for_range(series.min(), series.max())
+    return _decimal_type(values)
+
+def _text_type(series):
+    """VARCHAR sized to the longest value, TEXT/LONGTEXT for values too long for a VARCHAR."""
+    max_length = int(_as_strings(series).str.len().max())
+    if max_length <= MAX_VARCHAR_LENGTH:
+        return f'VARCHAR({max(max_length, 1)})'
+    if max_length <= MAX_TEXT_LENGTH:
+        return 'TEXT'
+    return 'LONGTEXT'
+
+def _datetime_type(parsed):
+    # A value with a time part is one that changes when cut back to midnight
+    if (parsed != parsed.dt.normalize()).any():
+        return 'DATETIME'
+    return 'DATE'
+
+def _parse_dates(series):
+    # Values too long for a date or without a digit are left out before the slow per-value parse
+    text = series.astype(str)
+    candidates = (text.str.len() <= DATE_MAX_LENGTH) & text.str.contains(r'\d', regex=True)
+    if candidates.mean() <= DATE_RATIO_THRESHOLD:
+        return pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]') # Too few to be a date column
+    try:
+        # 'mixed' parses every value on its own, the way the values are formatted later
+        return pd.to_datetime(series.where(candidates), errors='coerce', format='mixed')
+    except Exception:
+        return None
+
+def suggest_data_type(series, sample_rows=INFERENCE_SAMPLE_ROWS):
+    """
+    Suggests a MySQL type from the column content.
+    Numeric and datetime columns are checked in full with vectorized operations. Text columns
+    are tested for dates on a stratified sample, and on the full column only when the sample
+    is close to the threshold. Sizes (integer range, DECIMAL digits, VARCHAR length) always
+    come from the full column.
+    """
+    # Drop NaN values for type suggestion
+    series = series.dropna()
+
+    if series.empty:
+        return 'VARCHAR(255)' # Default for empty columns
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return _datetime_type(series)
+
+    if pd.api.types.is_numeric_dtype(series):
+        # Non-integer numbers that do not fit a DECIMAL are kept as text
+        return _numeric_type(series) or _text_type(series)
+
+    sample = stratified_sample(series, sample_rows)
+    if sample.map(type).eq(datetime.time).all():
+        return 'TIME' # Excel time cells are read as datetime.time objects
+
+    parsed = _parse_dates(sample)
+    if parsed is not None:
+        ratio = parsed.notna().mean()
+        if DATE_RATIO_AMBIGUOUS[0] < ratio < DATE_RATIO_AMBIGUOUS[1] and len(sample) < len(series):
+            # Too close to call from the sample, escalate to a full scan
+            parsed = _parse_dates(series)
+            ratio = parsed.notna().mean() if parsed is not None else 0
+        if ratio > DATE_RATIO_THRESHOLD:
+            return _datetime_type(parsed.dropna())
+
+    return _text_type(series)
+
+# Letters utf8_general_ci compares equal to a plain letter that NFKD does not decompose to it
+COLLATION_LETTERS = str.maketrans({'ı': 'i', 'İ': 'I', 'ß': 's'})
+
+def collation_key(value):
+    """
+    Folds a value the way MySQL's utf8_general_ci compares it: case and accent insensitive,
+    'İzmir' and 'Izmir', 'Şişli' and 'Sisli' are equal.
+    """
+    decomposed = unicodedata.normalize('NFKD', value.translate(COLLATION_LETTERS))
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+def suggest_enum_values(series, sample_rows=INFERENCE_SAMPLE_ROWS):
+    """
+    Returns the sorted distinct values of a text column that suits an ENUM, None otherwise.
+    The values must fit the comma-separated ENUM Values cell as they are (no commas, no outer spaces)
+    and stay distinct under MySQL's case- and accent-insensitive collation (see collation_key).
+    """
+    values = series.dropna()
+    if len(values) < ENUM_MIN_ROWS or not pd.api.types.is_string_dtype(values):
+        return None
+    if stratified_sample(values, sample_rows).nunique() > ENUM_MAX_VALUES:
+        return None # Cheap rejection of high-cardinality columns before hashing the full column
+    distinct = [str(value) for value in pd.unique(values)]
+    if len(distinct) > ENUM_MAX_VALUES:
+        return None
+    if any(not value or value != value.strip() or ',' in value for value in distinct):
+        return None
+    if len(set(collation_key(value) for value in distinct)) < len(distinct):
+        return None
+    return sorted(distinct)
+
+def unique_column_names(columns, table_name):
+    """
+    Maps the original column labels to cleaned, unique MySQL column names.
+    A column named 'id' becomes 'id_<table_name>' since 'id' is the auto-increment key.
+    """
+    used_names = set()
+    names = []
+    for original_col in columns:
+        cleaned_col = clean_name(original_col)
+        if cleaned_col == 'id':
+            cleaned_col = f'id_{table_name}'
+        # Ensure the name is unique, adding _1, _2, ... on conflicts
+        unique_col = cleaned_col
+        k = 1
+        while unique_col in used_names:
+            unique_col = f'{cleaned_col}_{k}'
+            k += 1
+        used_names.add(unique_col)
+        names.append(unique_col)
+    return names
+
+def widen_data_type(data_type):
+    """
+    Relaxes a size-fitted type for data that was only partly seen (streaming mode reads a sample),
+    so later rows are not truncated: VARCHAR(n) becomes VARCHAR(255), small integers INT(11)
+    and DECIMAL gets 10 more integer digits.
+    """
+    base = data_type.split('(')[0]
+    if base == 'VARCHAR':
+        return 'VARCHAR(255)'
+    if base in ('TINYINT', 'SMALLINT'):
+        return 'INT(11)'
+    if base == 'DECIMAL':
+        precision, scale = (int(part) for part in data_type[len('DECIMAL('):-1].split(','))
+        return f'DECIMAL({min(precision + 10, MAX_DECIMAL_PRECISION)},{scale})'
+    return data_type
+
+def _text_rank(data_type):
+    # Orders the text types by the values they hold
+    base = data_type.split('(')[0]
+    if base == 'VARCHAR':
+        return int(data_type[len('VARCHAR('):-1])
+    return {'TEXT': MAX_TEXT_LENGTH, 'LONGTEXT': MAX_TEXT_LENGTH + 1}[base]
+
+def _fit_number(values, data_type):
+    if not pd.api.types.is_numeric_dtype(values):
+        return _text_type(values) # Text such as A4 in a number column would be written as NULL
+    numbers = values.to_numpy(dtype=float)
+    if not np.isfinite(numbers).all():
+        return _text_type(values)
+    decimal = data_type.startswith('DECIMAL')
+    precision, scale = ((int(part) for part in data_type[len('DECIMAL('):-1].split(',')) if decimal else (0, 0))
+    if pd.api.types.is_integer_dtype(values) or pd.api.types.is_bool_dtype(values) \
+            or (numbers == np.trunc(numbers)).all():
+        if not decimal:
+            needed = _int_type_for_range(values.min(), values.max())
+            ranks = [int_type for int_type, _, _ in INT_RANGES]
+            current = data_type if data_type in ranks else 'INT(11)' if data_type.startswith('INT') else None
+            if current is not None and ranks.index(current) >= ranks.index(needed):
+                return data_type
+            return needed
+        needed_digits, needed_scale = len(str(int(np.abs(numbers).max()))), 0
+    else:
+        needed = _decimal_type(numbers)
+        if needed is None:
+            return _text_type(values)
+        if not decimal:
+            return needed
+        needed_precision, needed_scale = (int(part) for part in needed[len('DECIMAL('):-1].split(','))
+        needed_digits = needed_precision - needed_scale
+    if needed_digits <= precision - scale and needed_scale <= scale:
+        return data_type
+    digits, scale = max(needed_digits, precision - scale), max(needed_scale, scale)
+    return f'DECIMAL({digits + scale},{scale})' if digits + scale <= MAX_DECIMAL_PRECISION else _text_type(values)
+
+def _parse_all_dates(values):
+    # One format inferred for the whole column first, the slow per-value parse only for what it left
+    try:
+        parsed = pd.to_datetime(values, errors='coerce')
+    except Exception:
+        return _parse_dates(values)
+    unparsed = parsed.isna()
+    if unparsed.any():
+        rest = _parse_dates(values[unparsed])
+        if rest is not None:
+            parsed = parsed.astype('datetime64[ns]').where(~unparsed, rest.astype('datetime64[ns]'))
+    return parsed
+
+def fit_data_type(series, data_type):
+    """
+    Checks a type suggested from the first rows of a file against the whole column, with the same
+    vectorized checks as suggest_data_type. Returns data_type when it holds every value, otherwise
+    the type that does: a larger integer type, DECIMAL for fractions or more digits, DATETIME for
+    dates with a time, a longer VARCHAR or TEXT. TIME, ENUM and other types are kept.
+    """
+    values = series.dropna()
+    base = data_type.split('(')[0]
+    if values.empty or data_type != data_type.upper() or (base in ('VARCHAR', 'DECIMAL') and '(' not in data_type):
+        return data_type # Types typed in by hand in another form are left to the user
+    if is_int_type(data_type) or base == 'DECIMAL':
+        return _fit_number(values, data_type)
+    if base == 'DATE':
+        parsed = values if pd.api.types.is_datetime64_any_dtype(values) else _parse_all_dates(values)
+        if parsed is not None and not parsed.dropna().empty and _datetime_type(parsed.dropna()) == 'DATETIME':
+            return 'DATETIME'
+        return data_type
+    if base in ('VARCHAR', 'TEXT', 'LONGTEXT'):
+        needed = _text_type(values)
+        return needed if _text_rank(needed) > _text_rank(data_type) else data_type
+    return data_type
+
+def fit_column_specs(dataframe, column_specs, warn=None, stats=None):
+    """
+    Widens, in place, the types of column_specs that do not hold every value of the dataframe
+    (see fit_data_type), for specs suggested from a preview before the full read. warn gets one
+    message listing the widened columns. Returns their number.
+    """
+    widened = []
+    for spec in column_specs:
+        wall, cpu = time.perf_counter(), time.process_time()
+        data_type = fit_data_type(dataframe[spec.original_name], spec.data_type)
+        if stats is not None:
+            stats.add_column(spec.name, 'check type', time.perf_counter() - wall, time.process_time() - cpu)
+        if data_type != spec.data_type:
+            widened.append(f'{spec.name}: {spec.data_type} to {data_type}')
+            spec.data_type = data_type
+    if widened and warn:
+        warn('Rows after the preview hold values the chosen types cannot store, these columns were widened:\n'
+             + '\n'.join(widened))
+    return len(widened)
+
+def _suggest_column_spec(name, original_col, series, sample_rows, partial):
+    data_type = suggest_data_type(series, sample_rows)
+    if partial:
+        return ColumnSpec(name, original_col, widen_data_type(data_type))
+    enum_values = suggest_enum_values(series, sample_rows) if data_type.startswith('VARCHAR') else None
+    if enum_values:
+        return ColumnSpec(name, original_col, 'ENUM', enum_values_text=', '.join(enum_values))
+    return ColumnSpec(name, original_col, data_type)
+
+def build_column_specs(dataframe, table_name, sample_rows=INFERENCE_SAMPLE_ROWS, partial=False, stats=None):
+    """
+    Creates a ColumnSpec with a cleaned name and a suggested type for every column of the dataframe.
+    Text columns with few distinct values become ENUMs with their values filled in.
+    partial means the dataframe holds only the first rows of the file: suggested sizes are widened
+    and no ENUM is suggested, as later rows may hold other values.
+    stats (an instrumentation.RunStats) gets the inference time of every column.
+    """
+    columns = dataframe.columns.tolist()
+    column_specs = []
+    for name, original_col in zip(unique_column_names(columns, table_name), columns):
+        wall, cpu = time.perf_counter(), time.process_time()
+        column_specs.append(_suggest_column_spec(name, original_col, dataframe[original_col], sample_rows, partial))
+        if stats is not None:
+            stats.add_column(name, 'infer', time.perf_counter() - wall, time.process_time() - cpu)
+    return column_specs
+
+# Auto-increment primary key added in front of the file's columns, per SQL dialect
+ID_COLUMNS = {
+    'mysql': "    `id` INT(11) AUTO_INCREMENT PRIMARY KEY",
+    'sqlite': "    `id` INTEGER PRIMARY KEY AUTOINCREMENT",
+    'postgresql': '    "id" SERIAL PRIMARY KEY',
+}
+
+# PostgreSQL types of the MySQL ones, by base type; sizes of VARCHAR and DECIMAL are kept
+POSTGRESQL_TYPES = {
+    'TINYINT': 'SMALLINT', 'SMALLINT': 'SMALLINT', 'MEDIUMINT': 'INTEGER', 'INT': 'INTEGER', 'BIGINT': 'BIGINT',
+    'VARCHAR': 'VARCHAR', 'TEXT': 'TEXT', 'LONGTEXT': 'TEXT', 'ENUM': 'TEXT',
+    'DATE': 'DATE', 'TIME': 'TIME', 'DATETIME': 'TIMESTAMP', 'DECIMAL': 'NUMERIC',
+}
+
+def quote_name(name, dialect='mysql'):
+    """Quotes a table or column name: `name`, or "name" for PostgreSQL."""
+    return f'"{name}"' if dialect == 'postgresql' else f'`{name}`'
+
+def postgresql_type(data_type):
+    """The PostgreSQL type of a MySQL type: INT(11) is INTEGER, DECIMAL(10,2) NUMERIC(10,2). Unknown types are kept."""
+    base, _, size = data_type.partition('(')
+    mapped = POSTGRESQL_TYPES.get(base.strip().upper())
+    if mapped is None:
+        return data_type
+    return f'{mapped}({size}' if size and mapped in ('VARCHAR', 'NUMERIC') else mapped
+
+def _enum_literals(spec):
+    enum_values = []
+    for val in spec.enum_values_text.split(','):
+         cleaned_val = val.strip()
+         if cleaned_val:
+              escaped_val = cleaned_val.replace("'", "''")
+              enum_values.append(f"'{escaped_val}'")
+    return ', '.join(enum_values) if enum_values else "''" # Empty ENUM if no valid values entered
+
+def column_definition(spec, warn=None, dialect='mysql'):
+    """
+    Builds the CREATE TABLE line of one column.
+    warn is called with a message for settings that had to be skipped.
+    The 'sqlite' dialect stores ENUM columns as TEXT and leaves out the MySQL collation. The
+    'postgresql' dialect maps the types (see postgresql_type) and checks ENUM values with a CHECK.
+    """
+    data_type = spec.data_type
+    name = quote_name(spec.name, dialect)
+    if dialect == 'sqlite' and data_type == 'ENUM':
+         definition = f"    {name} TEXT"
+    elif dialect == 'postgresql':
+         definition = f"    {name} {postgresql_type(data_type)}"
+    else:
+         definition = f"    {name} {data_type}"
+
+    if data_type == 'ENUM' and dialect == 'mysql':
+         definition += f"({_enum_literals(spec)})"
+
+    # Add NULL/NOT NULL constraint
+    if not spec.allow_null:
+         definition += " NOT NULL"
+    else:
+         definition += " NULL" # Explicitly add NULL
+
+    # Add DEFAULT value
+    default_value = spec.default_value
+    if default_value:
+         # Need to format default value based on data type
+         if is_int_type(data_type):
+              # Ensure integer default value is valid
+              try:
+                   int(default_value)
+                   definition += f" DEFAULT {default_value}"
+              except ValueError:
+                   if warn:
+                        warn(f"Invalid default value '{default_value}' for INT/BIGINT column '{spec.name}'. Skipping default.")
+         else:
+              # Strings, dates and other types are quoted with escaping
+              escaped_default = default_value.replace("'", "''")
+              definition += f" DEFAULT '{escaped_default}'"
+
+    if data_type == 'ENUM' and dialect == 'postgresql':
+         definition += f" CHECK ({name} IN ({_enum_literals(spec)}))"
+
+    # Add COLLATE for string types
+    if dialect == 'mysql' and (data_type.startswith('VARCHAR') or data_type in ['TEXT', 'LONGTEXT', 'ENUM']):
+         definition += " COLLATE 'utf8_general_ci'"
+    return definition
+
+def create_table_sql(table_name, column_specs, warn=None, dialect='mysql', unique_key=None):
+    """
+    Builds the CREATE TABLE statement, with the auto-increment 'id' primary key first.
+    unique_key optionally lists the columns of a UNIQUE constraint, e.g. the key of incremental imports.
+    """
+    column_defs = [ID_COLUMNS[dialect]]
+    column_defs.extend(column_definition(spec, warn, dialect) for spec in column_specs)
+    if unique_key:
+        column_defs.append(f"    UNIQUE ({', '.join([quote_name(c, dialect) for c in unique_key])})")
+    return f"CREATE TABLE {quote_name(table_name, dialect)} (\n" + ",\n".join(column_defs) + "\n);\n\n"
+
+def split_insert_options(insert_options, output_options):
+    """
+    The InsertWriter options for an output split into parts: parts end between statements and a
+    statement that might overflow one starts the next, so without a Max KB per INSERT statements
+    are limited to a quarter part, which keeps the parts well filled.
+    """
+    insert_options = dict(insert_options or {})
+    if output_options.get('max_part_bytes') and not insert_options.get('max_bytes'):
+        insert_options['max_bytes'] = min(SPLIT_STATEMENT_BYTES, output_options['max_part_bytes'] // 4)
+    return insert_options
+
+def write_sql_file(output_filename, table_name, column_specs, chunks, insert_options=None, warn=None,
+                   progress=None, cancel_event=None, output_options=None, stats=None, formatter=None):
+    """
+    Writes the CREATE TABLE statement followed by the INSERT statements for all chunks.
+    insert_options are passed on to InsertWriter, output_options (compression, max_part_bytes) to
+    SqlOutput; CREATE TABLE only goes into the first part. Returns the number of rows written and
+    the files written. On cancellation the partial files are removed before ConversionCancelled is re-raised.
+    stats (an instrumentation.RunStats) gets the time spent per phase and column, and formatter
+    formats the rows on a process pool, see write_values.
+    """
+    output_options = output_options or {}
+    insert_options = split_insert_options(insert_options, output_options)
+    out = SqlOutput(output_filename, **output_options)
+    try:
+        out.write(create_table_sql(table_name, column_specs, warn))
+        writer = InsertWriter(out, table_name, [spec.name for spec in column_specs], **insert_options)
+        writer.begin()
+        # Each chunk is formatted column by column, then zipped into row tuples
+        write_values(writer, chunks, column_specs, progress, cancel_event, stats, formatter)
+        writer.finish()
+    except ConversionCancelled:
+        out.abort()
+        raise
+    except BaseException:
+        out.close()
+        raise
+    with _phase(stats, 'finish output'): # The last blocks are compressed and written here
+        out.close()
+    if stats is not None:
+        stats.info.update({'output_files': out.paths, 'rows_written': writer.rows_written,
+                           'bytes_written': out.bytes_written})
+    return writer.rows_written, out.paths
+
+def prepare_input(input_path, table_name=None, stream=False, sample_rows=INFERENCE_SAMPLE_ROWS, sheet_name=None,
+                  engine=None, encoding=None, decode_errors='strict', warn=None, stats=None, profiles=None):
+    """
+    Reads an input file (or one sheet of a workbook) for a headless conversion and suggests its
+    column settings. The table name defaults to the cleaned file name, engine names the reader
+    used for a full (non-streaming) read, see READER_ENGINES. A CSV is read with encoding
+    (detected when None) and the decode_errors policy; with 'report' the replaced lines go to warn.
+    With profiles (a profiles.ProfileCache) the saved column settings of a file with the same
+    columns are used instead of inferring them.
+    stats (an instrumentation.RunStats) gets the read and inference phases.
+    Returns the cleaned table name, the column specs and an iterator over the data chunks.
+    """
+    if not table_name:
+        table_name = os.path.splitext(os.path.basename(input_path))[0]
+    table_name = clean_name(table_name)
+    if not table_name:
+        raise ValueError(f'Invalid MySQL table name for {input_path}')
+
+    with _phase(stats, 'read sample' if stream else 'read') as entry:
+        if stream:
+            dataframe, encoding = read_sample(input_path, sheet_name=sheet_name, encoding=encoding,
+                                              decode_errors=decode_errors)
+            chunks = iter_chunks(input_path, encoding=encoding, sheet_name=sheet_name, decode_errors=decode_errors)
+        else:
+            dataframe, encoding = load_dataframe(input_path, sheet_name, engine=reader_engine(input_path, engine),
+                                                 encoding=encoding, decode_errors=decode_errors)
+            chunks = dataframe_chunks(dataframe)
+            entry['bytes'] = os.path.getsize(input_path)
+        entry['rows'] = len(dataframe)
+    if encoding and decode_errors == 'report':
+        with _phase(stats, 'check encoding'):
+            check_decoding(input_path, encoding, warn)
+    column_specs = None
+    if profiles is not None:
+        with _phase(stats, 'load profile'):
+            if sheet_name is None and is_workbook(input_path):
+                sheet_name = sheet_names(input_path)[0]
+            column_specs = profiles.get(dataframe.columns, sheet_name)
+    from_profile = column_specs is not None
+    if not from_profile:
+        with _phase(stats, 'infer types') as entry:
+            column_specs = build_column_specs(dataframe, table_name, sample_rows, partial=stream, stats=stats)
+            entry['rows'] = len(dataframe)
+    if stats is not None:
+        stats.info.update({'input_file': input_path, 'encoding': encoding, 'table_name': table_name,
+                           'columns': len(column_specs), 'profile': from_profile})
+    return table_name, column_specs, chunks
+
+def convert_file(input_path, output_filename, table_name=None, stream=False, insert_options=None, warn=None,
+                 sample_rows=INFERENCE_SAMPLE_ROWS, engine=None, encoding=None, decode_errors='strict',
+                 output_options=None, stats=None, profiles=None, formatter=None):
+    """
+    Converts one input file to a .sql file with the suggested (or saved, see profiles) column settings,
+    see prepare_input. formatter optionally formats the rows on a process pool, see write_values.
+    Returns the number of rows written and the files written, see write_sql_file.
+    """
+    table_name, column_specs, chunks = prepare_input(input_path, table_name, stream, sample_rows, engine=engine,
+                                                     encoding=encoding, decode_errors=decode_errors, warn=warn,
+                                                     stats=stats, profiles=profiles)
+    return write_sql_file(output_filename, table_name, column_specs, chunks, insert_options, warn,
+                          output_options=output_options, stats=stats, formatter=formatter)
+
+def _convert_sheet(input_path, sheet_name, dataframe, table_name, output_filename, column_specs, insert_options,
+                   sample_rows, output_options, profiles):
+    # Runs in a worker process; without a dataframe (streaming) the worker reads its own sheet
+    warnings = []
+    if dataframe is None:
+        table_name, suggested_specs, chunks = prepare_input(input_path, table_name, True, sample_rows, sheet_name,
+                                                            profiles=None if column_specs else profiles)
+    else:
+        suggested_specs = None
+        if not column_specs and profiles is not None:
+            suggested_specs = profiles.get(dataframe.columns, sheet_name)
+        if not column_specs and suggested_specs is None:
+            suggested_specs = build_column_specs(dataframe, table_name, sample_rows)
+        chunks = dataframe_chunks(dataframe)
+    rows, paths = write_sql_file(output_filename, table_name, column_specs or suggested_specs, chunks, insert_options,
+                                 warn=warnings.append, output_options=output_options)
+    return rows, paths, warnings
+
+def sheet_output_filename(output_filename, table_name):
+    """The per-sheet file next to output_filename: data.sql and table 'ocak' give data_ocak.sql."""
+    return f'{os.path.splitext(output_filename)[0]}_{table_name}.sql'
+
+def convert_workbook(input_path, output_filename, per_sheet_files=False, stream=False, insert_options=None, warn=None,
+                     sample_rows=INFERENCE_SAMPLE_ROWS, workers=None, executor=None, column_specs=None,
+                     progress=None, cancel_event=None, engine=None, output_options=None, profiles=None):
+    """
+    Converts every sheet of a workbook into its own table, named after the sheet (see sheet_table_names).
+    The workbook is parsed once, then type inference and SQL generation run for the sheets in parallel
+    on a process pool (executor, or a new one with workers processes). In streaming mode each worker
+    reads its own sheet chunk by chunk instead. column_specs optionally maps sheet names to edited specs,
+    other sheets use their saved profile in profiles (a profiles.ProfileCache) or the suggested settings.
+
+    The result is one combined script output_filename, or with per_sheet_files one file per sheet
+    (see sheet_output_filename), which can be compressed and split with output_options, see write_sql_file.
+    engine names the reader, see READER_ENGINES. progress is called with the number of sheets done.
+    On cancellation or an error the files written so far are removed. Returns a list of
+    (sheet name, table name, output files, rows written) in workbook order.
+    """
+    output_options = output_options or {}
+    if not per_sheet_files and (output_options.get('compression') or output_options.get('max_part_bytes')):
+        raise ValueError('Compressed or split output needs one file per sheet.')
+    with pd.ExcelFile(input_path, engine=reader_engine(input_path, engine)) as workbook:
+        names = list(workbook.sheet_names)
+        dataframes = [None] * len(names) if stream else [workbook.parse(name) for name in names]
+    table_names = sheet_table_names(names)
+    if per_sheet_files:
+        outputs = [sheet_output_filename(output_filename, table_name) for table_name in table_names]
+    else:
+        # Each sheet is written to a part file, joined in workbook order when all are done
+        outputs = [f'{output_filename}.part{i}' for i in range(len(names))]
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(names)))
+    futures = {}
+    # Removed again if the conversion does not complete
+    written = [output_filename_for(path, output_options.get('compression')) for path in outputs]
+    try:
+        for i, name in enumerate(names):
+            futures[executor.submit(_convert_sheet, input_path, name, dataframes[i], table_names[i], outputs[i],
+                                    (column_specs or {}).get(name), insert_options, sample_rows, output_options,
+                                    profiles)] = i
+        dataframes = None # The workers have their copies
+        rows = [0] * len(names)
+        paths = [[path] for path in outputs]
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            if cancel_event is not None and cancel_event.is_set():
+                raise ConversionCancelled()
+            for future in done:
+                i = futures[future]
+                try:
+                    rows[i], paths[i], warnings = future.result()
+                except Exception as e:
+                    raise RuntimeError(f"Sheet '{names[i]}': {e}") from e
+                for message in warnings:
+                    if warn:
+                        warn(f"Sheet '{names[i]}': {message}")
+            if progress:
+                progress(len(names) - len(pending))
+
+        if not per_sheet_files:
+            written.append(output_filename)
+            with open(output_filename, 'w', encoding='utf-8') as f:
+                for part, name in zip(outputs, names):
+                    f.write(f"-- Sheet: {name}\n")
+                    with open(part, encoding='utf-8') as part_file:
+                        shutil.copyfileobj(part_file, f)
+                    f.write("\n")
+            for part in outputs:
+                os.remove(part)
+            paths = [[output_filename]] * len(names)
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        wait(futures) # Running sheets still finish their files, which are removed below
+        for future in futures:
+            if not future.cancelled() and future.exception() is None:
+                written.extend(future.result()[1])
+        for path in written:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return list(zip(names, table_names, paths, rows))
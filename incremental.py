@@ -0,0 +1,312 @@
+"""
+Incremental re-imports of a file that changes a little between runs. Every row is fingerprinted
+by its key values and its content, and the fingerprints are saved in a manifest next to the
+output. The first run writes the full script (with a UNIQUE key on the key columns), later runs
+only upsert new and changed rows (INSERT ... ON DUPLICATE KEY UPDATE) and DELETE the rows that
+are gone, without CREATE TABLE. Later runs keep the column types of the first run, the table's types.
+"""
+import dataclasses
+import os
+
+import numpy as np
+import pandas as pd
+
+from converter import (INFERENCE_SAMPLE_ROWS, ConversionCancelled, InsertWriter, collation_key, create_table_sql,
+                       fit_data_type, format_column_values, format_rows, prepare_input, split_insert_options)
+from sql_output import SqlOutput
+
+DELETE_BATCH_KEYS = 1000 # Keys per DELETE statement
+HASH_MULTIPLIER = np.uint64(0x100000001B3) # Combines the column hashes of a row, in column order
+NULL_HASH = np.uint64(0) # Hash of a missing value, whatever the column's dtype
+
+
+def manifest_filename(output_filename):
+    """The fingerprint manifest kept next to the output: data.sql has data.manifest.npz."""
+    return os.path.splitext(output_filename)[0] + '.manifest.npz'
+
+
+def resolve_key_columns(column_specs, key_columns):
+    """
+    Picks the specs of the key columns, given by their MySQL or their original names.
+    Raises ValueError for names that are not among the columns.
+    """
+    key_specs = []
+    for key in key_columns:
+        matches = [spec for spec in column_specs if key in (spec.name, str(spec.original_name))]
+        if not matches:
+            raise ValueError(f"Key column '{key}' is not one of the columns.")
+        key_specs.append(matches[0])
+    return key_specs
+
+
+def _column_hashes(series):
+    # Integral floats (ints with missing values) hash like ints and datetimes at one resolution,
+    # so a column read with another dtype on the next run or in the next chunk keeps its hashes
+    if pd.api.types.is_float_dtype(series):
+        values = series.dropna()
+        if ((values == np.trunc(values)) & (values.abs() < 2**63)).all():
+            series = series.astype('Int64')
+    elif pd.api.types.is_datetime64_any_dtype(series) and getattr(series.dt, 'tz', None) is None:
+        series = series.astype('datetime64[us]')
+    hashes = pd.util.hash_pandas_object(series, index=False).to_numpy(copy=True)
+    hashes[series.isna().to_numpy()] = NULL_HASH
+    return hashes
+
+
+def fingerprint(dataframe, column_specs):
+    """One uint64 hash per row over the columns of column_specs, vectorized column by column."""
+    hashes = np.zeros(len(dataframe), dtype=np.uint64)
+    for spec in column_specs:
+        hashes = hashes * HASH_MULTIPLIER ^ _column_hashes(dataframe[spec.original_name])
+    return hashes
+
+
+def _key_columns(dataframe, key_specs):
+    row_dtype = dataframe.iloc[:0].values.dtype # Same upcast as the INSERT statements
+    return [format_column_values(dataframe[spec.original_name], spec.data_type, row_dtype) for spec in key_specs]
+
+
+def _joined_literals(columns):
+    if len(columns) == 1:
+        return np.asarray(columns[0], dtype=object)
+    return np.array(['(' + ', '.join(values) + ')' for values in zip(*columns)], dtype=object)
+
+
+def key_literals(dataframe, key_specs):
+    """The SQL literal of every row's key: 5, or (5, 'x') for several key columns."""
+    return _joined_literals(_key_columns(dataframe, key_specs))
+
+
+def key_fingerprint(dataframe, key_specs):
+    """
+    The key literals of every row (see key_literals) and one uint64 hash per row of their values
+    without quotes. Keys are matched on the values MySQL compares, not on the dtype pandas read
+    them with: a code column read as int64 on one run and as text on the next (once a value like
+    A4 appears) keeps the hashes of its keys.
+    """
+    columns = _key_columns(dataframe, key_specs)
+    hashes = np.zeros(len(dataframe), dtype=np.uint64)
+    for values in columns:
+        text = pd.Series(values, dtype=object)
+        quoted = text.str.startswith("'").to_numpy(dtype=bool)
+        text[quoted] = text[quoted].str.slice(1, -1)
+        hashes = hashes * HASH_MULTIPLIER ^ pd.util.hash_array(text.to_numpy(dtype=object))
+    return _joined_literals(columns), hashes
+
+
+def read_manifest(path, table_name, column_specs, key_specs):
+    """
+    Loads a manifest written by save_manifest, None when there is none yet. Its 'column_types' are
+    the types and ENUM values of the table (None for manifests written before they were saved).
+    Raises ValueError when it was written for another table, other columns or another key.
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as manifest:
+        if (str(manifest['table_name']) != table_name
+                or manifest['columns'].tolist() != [spec.name for spec in column_specs]
+                or manifest['key_columns'].tolist() != [spec.name for spec in key_specs]):
+            raise ValueError(f'{path} was written for other columns or another key. Delete it to start over '
+                             f'with a full import.')
+        previous = {name: manifest[name] for name in ('key_hashes', 'row_hashes')}
+        if 'key_literal_bytes' in manifest.files:
+            previous['key_literals'] = _unpack_literals(manifest['key_literal_bytes'], manifest['key_literal_offsets'])
+        else:
+            previous['key_literals'] = manifest['key_literals'].astype(object) # Fixed-width, older manifests
+        previous['column_types'] = (list(zip(manifest['data_types'].tolist(), manifest['enum_values'].tolist()))
+                                    if 'data_types' in manifest.files else None)
+        return previous
+
+
+def _pack_literals(literals):
+    # One UTF-8 buffer and the end offsets of the literals in it, sized by the literals' own lengths
+    # (a fixed-width str array takes the longest key's size for every row)
+    encoded = [literal.encode('utf-8') for literal in literals]
+    offsets = np.cumsum([len(literal) for literal in encoded], dtype=np.int64)
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_literals(buffer, offsets):
+    data = buffer.tobytes()
+    starts = np.concatenate(([0], offsets[:-1])).tolist()
+    return np.array([data[start:end].decode('utf-8') for start, end in zip(starts, offsets.tolist())], dtype=object)
+
+
+def save_manifest(path, table_name, column_specs, key_specs, key_hashes, row_hashes, literals):
+    """Saves the fingerprints sorted by key hash, so the next run can look keys up with searchsorted."""
+    order = np.argsort(key_hashes, kind='stable')
+    literal_bytes, literal_offsets = _pack_literals(literals[order])
+    temporary = path + '.tmp.npz'
+    np.savez(temporary, table_name=np.array(table_name), columns=np.array([spec.name for spec in column_specs]),
+             data_types=np.array([spec.data_type for spec in column_specs]),
+             enum_values=np.array([spec.enum_values_text for spec in column_specs]),
+             key_columns=np.array([spec.name for spec in key_specs]), key_hashes=key_hashes[order],
+             row_hashes=row_hashes[order], key_literal_bytes=literal_bytes,
+             key_literal_offsets=literal_offsets)
+    os.replace(temporary, path) # The old manifest stays valid until the new one is complete
+
+
+def table_column_specs(column_specs, column_types):
+    """column_specs with the types and ENUM values the first run created the table with (see read_manifest)."""
+    return [dataclasses.replace(spec, data_type=data_type, enum_values_text=enum_values)
+            for spec, (data_type, enum_values) in zip(column_specs, column_types)]
+
+
+def check_column_types(dataframe, column_specs, manifest_path):
+    """
+    Raises ValueError when a value of dataframe does not fit its column's type in the table: a number
+    too large, a fraction, a longer text (see fit_data_type) or a value that is not one of an ENUM's.
+    """
+    for spec in column_specs:
+        values = dataframe[spec.original_name]
+        if spec.data_type == 'ENUM':
+            allowed = set(collation_key(value.strip()) for value in spec.enum_values_text.split(','))
+            known = values.dropna().astype(str).str.strip().map(collation_key).isin(allowed)
+            needed = None if known.all() else 'other ENUM values'
+        else:
+            needed = fit_data_type(values, spec.data_type)
+            needed = None if needed == spec.data_type else needed
+        if needed:
+            raise ValueError(f"Column '{spec.name}' now holds values its type in the table, {spec.data_type}, cannot "
+                             f"store (they need {needed}). Widen the column with ALTER TABLE and delete "
+                             f"{manifest_path} to start over with a full import.")
+
+
+def _last_per_key(key_hashes, row_hashes, literals):
+    # Keeps the last row of every key, the one the upserts leave in the table
+    reversed_keys = key_hashes[::-1]
+    _, first = np.unique(reversed_keys, return_index=True)
+    keep = len(key_hashes) - 1 - first
+    return key_hashes[keep], row_hashes[keep], literals[keep]
+
+
+def delete_statements(table_name, key_specs, literals):
+    """DELETE statements for the given key literals, DELETE_BATCH_KEYS keys each."""
+    if len(key_specs) == 1:
+        target = f'`{key_specs[0].name}`'
+    else:
+        target = '(' + ', '.join([f'`{spec.name}`' for spec in key_specs]) + ')'
+    for start in range(0, len(literals), DELETE_BATCH_KEYS):
+        keys = ', '.join(literals[start:start + DELETE_BATCH_KEYS])
+        yield f'DELETE FROM `{table_name}` WHERE {target} IN ({keys})'
+
+
+def write_incremental_sql(output_filename, table_name, column_specs, chunks, key_columns, insert_options=None,
+                          warn=None, progress=None, cancel_event=None, output_options=None, stats=None,
+                          formatter=None):
+    """
+    Writes the changes since the previous run, as recorded in the manifest next to output_filename
+    (see manifest_filename). Without a manifest this is the full script, with CREATE TABLE and a
+    UNIQUE key on key_columns. Rows are upserts, so loading a script twice does no harm. Rows with
+    an empty key column are skipped, rows sharing a key end up as the last of them.
+    Later runs write the columns with the types of the first run, the table's, and raise ValueError
+    (removing the script) when changed rows hold values those types cannot store.
+    The manifest is only replaced once the script is complete, load every script before the next run.
+    stats (an instrumentation.RunStats) gets the formatting time of every column. formatter
+    (a parallel_format.ParallelFormatter) formats the changed rows on its process pool.
+    Returns the counts of new, changed, unchanged and deleted rows and the files written.
+    """
+    key_specs = resolve_key_columns(column_specs, key_columns)
+    path = manifest_filename(output_filename)
+    previous = read_manifest(path, table_name, column_specs, key_specs)
+    if previous is not None and previous['column_types'] is not None:
+        # Only the first run creates the table, the types suggested for this run's rows do not apply
+        column_specs = table_column_specs(column_specs, previous['column_types'])
+        key_specs = resolve_key_columns(column_specs, key_columns)
+    for spec in key_specs:
+        if spec.data_type in ('TEXT', 'LONGTEXT') and warn:
+            warn(f"Key column '{spec.name}' is {spec.data_type}, MySQL cannot put it in a UNIQUE key. "
+                 f"Use a VARCHAR type.")
+
+    output_options = output_options or {}
+    insert_options = split_insert_options(insert_options, output_options)
+    names = [spec.name for spec in column_specs]
+    key_names = [spec.name for spec in key_specs]
+    update_columns = [name for name in names if name not in key_names] or key_names
+    value_specs = [spec for spec in column_specs if spec.name not in key_names]
+    counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'deleted': 0}
+    key_parts, row_parts, literal_parts = [], [], []
+    skipped = 0
+    out = SqlOutput(output_filename, **output_options)
+    try:
+        if previous is None:
+            out.write(create_table_sql(table_name, column_specs, warn, unique_key=key_names))
+        writer = InsertWriter(out, table_name, names, update_columns=update_columns, **insert_options)
+        writer.begin()
+        for chunk in chunks:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ConversionCancelled()
+            has_key = chunk[[spec.original_name for spec in key_specs]].notna().all(axis=1).to_numpy()
+            if not has_key.all():
+                skipped += int((~has_key).sum())
+                chunk = chunk[has_key]
+            literals, key_hashes = key_fingerprint(chunk, key_specs)
+            # The key columns count with their key hashes, so a key read with another dtype is not a change
+            row_hashes = fingerprint(chunk, value_specs) * HASH_MULTIPLIER ^ key_hashes
+            if previous is None:
+                found = np.zeros(len(chunk), dtype=bool)
+            else:
+                old_keys = previous['key_hashes']
+                positions = np.minimum(np.searchsorted(old_keys, key_hashes), max(len(old_keys) - 1, 0))
+                found = old_keys[positions] == key_hashes if len(old_keys) else np.zeros(len(chunk), dtype=bool)
+            changed = ~found
+            if previous is not None and found.any():
+                changed[found] = previous['row_hashes'][positions[found]] != row_hashes[found]
+            counts['new'] += int((~found).sum())
+            counts['changed'] += int((changed & found).sum())
+            counts['unchanged'] += int((~changed).sum())
+            if changed.any():
+                rows = chunk[changed]
+                if previous is not None:
+                    check_column_types(rows, column_specs, path)
+                writer.write(formatter.format_rows(rows, column_specs, stats) if formatter is not None
+                             else format_rows(rows, column_specs, stats))
+            key_parts.append(key_hashes)
+            row_parts.append(row_hashes)
+            literal_parts.append(literals)
+            if progress:
+                progress(counts['new'] + counts['changed'] + counts['unchanged'])
+
+        key_hashes, row_hashes, literals = (np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+                                            for parts, dtype in ((key_parts, np.uint64), (row_parts, np.uint64),
+                                                                 (literal_parts, object)))
+        duplicates = len(key_hashes)
+        key_hashes, row_hashes, literals = _last_per_key(key_hashes, row_hashes, literals)
+        duplicates -= len(key_hashes)
+        if previous is not None:
+            gone = ~np.isin(previous['key_hashes'], key_hashes)
+            # The DELETEs run after the upserts: a key written by this script is never deleted, even
+            # when its hash differs from the manifest's (a manifest of an older version)
+            gone &= ~pd.Series(previous['key_literals']).isin(literals).to_numpy()
+            counts['deleted'] = int(gone.sum())
+            for statement in delete_statements(table_name, key_specs, previous['key_literals'][gone]):
+                writer.write_statement(statement)
+        writer.finish()
+    except (ConversionCancelled, ValueError):
+        out.abort() # A script cut short by values the table cannot store is not loaded either
+        raise
+    except BaseException:
+        out.close()
+        raise
+    out.close()
+    save_manifest(path, table_name, column_specs, key_specs, key_hashes, row_hashes, literals)
+    if skipped and warn:
+        warn(f'{skipped} rows with an empty key column were skipped.')
+    if duplicates and warn:
+        warn(f'{duplicates} rows repeat the key of another row, only the last of them is kept.')
+    return counts, out.paths
+
+
+def convert_file_incremental(input_path, output_filename, key_columns, table_name=None, stream=False,
+                             insert_options=None, warn=None, sample_rows=INFERENCE_SAMPLE_ROWS, engine=None,
+                             encoding=None, decode_errors='strict', output_options=None, stats=None, profiles=None,
+                             formatter=None):
+    """
+    Converts the changes of one input file since the previous run with the suggested (or saved, see
+    profiles) column settings, see prepare_input and write_incremental_sql.
+    """
+    table_name, column_specs, chunks = prepare_input(input_path, table_name, stream, sample_rows, engine=engine,
+                                                     encoding=encoding, decode_errors=decode_errors, warn=warn,
+                                                     stats=stats, profiles=profiles)
+    return write_incremental_sql(output_filename, table_name, column_specs, chunks, key_columns, insert_options,
+                                 warn, output_options=output_options, stats=stats, formatter=formatter)
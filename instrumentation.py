@@ -0,0 +1,178 @@
+"""
+Run instrumentation: wall time, CPU time, memory, rows and bytes of every phase of a conversion
+(reading, type inference, formatting, writing, ...) and the inference and formatting time of
+every column. Shown in the GUI's Run details panel and optionally saved as a JSON report.
+"""
+import copy
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+def reset_peak_rss():
+    """Resets the kernel's peak RSS of this process (Linux), so the next reading covers one phase."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak RSS since the last reset_peak_rss, or since the start where that is not supported."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if sys.platform == 'win32':
+        return _windows_peak_rss_mb()
+    import resource # Unix only
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+
+def _windows_peak_rss_mb():
+    # PeakWorkingSetSize of GetProcessMemoryInfo, 0.0 when it is not available
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return 0.0
+    except (AttributeError, OSError):
+        return 0.0
+    return counters.PeakWorkingSetSize / (1024 * 1024)
+
+
+def report_filename(output_filename):
+    """The JSON run report next to the output: data.sql has data.run.json."""
+    return os.path.splitext(output_filename)[0] + '.run.json'
+
+
+class RunStats:
+    """
+    Measurements of one run. phase() measures a step as a whole, including its peak RSS (and with
+    trace_memory the peak of Python allocations, which slows the run down). add() accumulates steps
+    that alternate chunk by chunk, e.g. formatting and writing, and add_column() per-column times.
+    CPU time is the process' CPU time, so it includes other threads.
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.phases = {} # Phase name: measurements, in the order the phases ran
+        self.columns = {} # Column name: {phase: {'wall': ..., 'cpu': ...}}
+        self.info = {} # Input file, output files, ... for the report
+
+    def _entry(self, name):
+        return self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'rows': 0, 'bytes': 0})
+
+    @contextmanager
+    def phase(self, name):
+        """Measures the with block as phase name. The yielded dict takes 'rows' and 'bytes'."""
+        entry = self._entry(name)
+        reset_peak_rss()
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        elif self.trace_memory:
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield entry
+        finally:
+            entry['wall'] += time.perf_counter() - wall
+            entry['cpu'] += time.process_time() - cpu
+            entry['peak_rss_mb'] = max(entry.get('peak_rss_mb', 0.0), peak_rss_mb())
+            if self.trace_memory:
+                traced_mb = tracemalloc.get_traced_memory()[1] / 2**20
+                entry['peak_traced_mb'] = max(entry.get('peak_traced_mb', 0.0), traced_mb)
+            if tracing:
+                tracemalloc.stop()
+
+    @contextmanager
+    def tracing(self):
+        """With trace_memory, traces Python allocations in the with block for the steps add() records there."""
+        started = self.trace_memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            yield
+        finally:
+            if started:
+                tracemalloc.stop()
+
+    def add(self, name, wall, cpu, rows=0, nbytes=0):
+        # The peaks are the ones since the last phase() started, steps added in turn share them
+        entry = self._entry(name)
+        entry['wall'] += wall
+        entry['cpu'] += cpu
+        entry['rows'] += rows
+        entry['bytes'] += nbytes
+        entry['peak_rss_mb'] = max(entry.get('peak_rss_mb', 0.0), peak_rss_mb())
+        if self.trace_memory and tracemalloc.is_tracing():
+            traced_mb = tracemalloc.get_traced_memory()[1] / 2**20
+            entry['peak_traced_mb'] = max(entry.get('peak_traced_mb', 0.0), traced_mb)
+
+    def add_column(self, column, name, wall, cpu):
+        entry = self.columns.setdefault(str(column), {}).setdefault(name, {'wall': 0.0, 'cpu': 0.0})
+        entry['wall'] += wall
+        entry['cpu'] += cpu
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    def as_dict(self):
+        phases = {}
+        for name, entry in self.phases.items():
+            phases[name] = dict(entry)
+            if entry['rows'] and entry['wall'] > 0:
+                phases[name]['rows_per_s'] = entry['rows'] / entry['wall']
+        return {'info': self.info, 'phases': phases, 'columns': self.columns}
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.as_dict(), f, indent=2, ensure_ascii=False, default=str)
+
+    def slowest_columns(self, count=10):
+        """The columns with the most wall time over all phases, slowest first, as (name, seconds, per phase)."""
+        totals = [(name, sum(entry['wall'] for entry in phases.values()), phases)
+                  for name, phases in self.columns.items()]
+        return sorted(totals, key=lambda total: total[1], reverse=True)[:count]
+
+    def summary(self):
+        """Plain text table of the phases and the slowest columns."""
+        traced = any('peak_traced_mb' in entry for entry in self.phases.values())
+        lines = [f"{'Phase':<20}{'Wall s':>9}{'CPU s':>9}{'Rows':>12}{'Rows/s':>12}{'MB':>9}{'Peak RSS MB':>13}"
+                 + (f"{'Python MB':>11}" if traced else '')]
+        for name, entry in self.phases.items():
+            rows = f"{entry['rows']:,}" if entry['rows'] else ''
+            rate = f"{entry['rows'] / entry['wall']:,.0f}" if entry['rows'] and entry['wall'] > 0 else ''
+            size = f"{entry['bytes'] / 2**20:,.1f}" if entry['bytes'] else ''
+            peak = f"{entry['peak_rss_mb']:,.0f}" if 'peak_rss_mb' in entry else ''
+            python = f"{entry['peak_traced_mb']:,.1f}" if 'peak_traced_mb' in entry else ''
+            lines.append(f"{name:<20}{entry['wall']:>9.3f}{entry['cpu']:>9.3f}{rows:>12}{rate:>12}{size:>9}{peak:>13}"
+                         + (f'{python:>11}' if traced else ''))
+        slowest = self.slowest_columns()
+        if slowest:
+            lines.append('')
+            lines.append(f"{'Slowest columns':<20}{'Wall s':>9}  Per phase")
+            for name, seconds, phases in slowest:
+                parts = ', '.join(f"{phase} {entry['wall']:.3f}" for phase, entry in phases.items())
+                lines.append(f'{name[:19]:<20}{seconds:>9.3f}  {parts}')
+        return '\n'.join(lines)
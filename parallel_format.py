@@ -0,0 +1,233 @@
+"""
+Formatting of the VALUES tuples on a process pool, for wide or text-heavy inputs where formatting
+keeps one core busy while the others wait. Every chunk is cut into row ranges, one per worker.
+The columns the conversion uses are copied once per chunk into a shared memory block: numeric,
+boolean and datetime columns as their raw arrays, text columns as UTF-8 text with a missing-value
+mask. A worker attaches to the block, rebuilds the rows of its range and returns their tuples,
+which are written in the original row order.
+"""
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from converter import format_rows as _format_rows
+from instrumentation import RunStats
+
+FORMAT_WORKERS = os.cpu_count() or 1
+MIN_PARTITION_ROWS = 2000 # Smaller row ranges cost more to hand out than to format
+PENDING_CHUNKS = 2 # Chunks formatted ahead of the one being written, bounds memory
+TEXT_SEPARATOR = '\x00' # Joins the values of a text column; columns containing it are pickled instead
+
+
+def _partitions(rows, workers):
+    count = max(1, min(workers, rows // MIN_PARTITION_ROWS))
+    bounds = np.linspace(0, rows, count + 1).astype(np.int64)
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def _text_blocks(series, partitions):
+    # The UTF-8 text of every row range, None when the column is not all strings or holds the separator
+    if not (pd.api.types.is_string_dtype(series) and pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty')):
+        return None
+    mask = series.isna().to_numpy()
+    values = series.to_numpy(dtype=object)
+    if mask.any():
+        values = values.copy()
+        values[mask] = ''
+    values = values.tolist() # str.join takes lists fastest
+    blocks = []
+    for start, stop in partitions:
+        text = TEXT_SEPARATOR.join(values[start:stop])
+        if text.count(TEXT_SEPARATOR) != stop - start - 1:
+            return None
+        blocks.append(text.encode('utf-8', 'surrogatepass'))
+    return mask, blocks
+
+
+def share_columns(dataframe, names, partitions):
+    """
+    Copies the columns names of dataframe into a new shared memory block. Returns the block and,
+    for every row range in partitions, the column descriptions a worker rebuilds its rows from
+    (see rebuild_columns). Columns of other dtypes (categories, nullable integers, time zones,
+    mixed objects) are sliced and pickled instead. The caller unlinks the block.
+    """
+    layout, size = [], 0
+    for name in names:
+        series = dataframe[name]
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM':
+            array = series.to_numpy()
+            layout.append((name, 'array', array, size))
+            size += array.nbytes
+            continue
+        text = _text_blocks(series, partitions)
+        if text is None:
+            layout.append((name, 'series', series, None))
+            continue
+        mask, blocks = text
+        layout.append((name, 'text', (series.dtype, mask, blocks), size))
+        size += mask.nbytes + sum(len(block) for block in blocks)
+
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    buffer = np.ndarray(max(size, 1), dtype=np.uint8, buffer=block.buf)
+    descriptions = [[] for _ in partitions]
+    for name, kind, data, offset in layout:
+        if kind == 'array':
+            buffer[offset:offset + data.nbytes] = np.ascontiguousarray(data).view(np.uint8).reshape(-1)
+            for columns, (start, stop) in zip(descriptions, partitions):
+                columns.append((name, kind, (data.dtype.str, offset + start * data.itemsize, stop - start)))
+        elif kind == 'series':
+            for columns, (start, stop) in zip(descriptions, partitions):
+                columns.append((name, kind, data.iloc[start:stop]))
+        else:
+            dtype, mask, blocks = data
+            buffer[offset:offset + mask.nbytes] = mask.view(np.uint8)
+            text_offset = offset + mask.nbytes
+            for columns, (start, stop), text in zip(descriptions, partitions, blocks):
+                buffer[text_offset:text_offset + len(text)] = np.frombuffer(text, dtype=np.uint8)
+                columns.append((name, kind, (dtype, offset + start, text_offset, len(text), stop - start)))
+                text_offset += len(text)
+    del buffer # The block can only be closed without views into it
+    return block, descriptions
+
+
+def rebuild_columns(buffer, columns):
+    """The DataFrame of one row range from its column descriptions (see share_columns) and the block's buffer."""
+    data = {}
+    for name, kind, description in columns:
+        if kind == 'array':
+            dtype, offset, count = description
+            data[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).copy()
+        elif kind == 'series':
+            data[name] = description.reset_index(drop=True)
+        else:
+            dtype, mask_offset, text_offset, nbytes, count = description
+            mask = np.frombuffer(buffer, dtype=bool, count=count, offset=mask_offset)
+            text = bytes(buffer[text_offset:text_offset + nbytes]).decode('utf-8', 'surrogatepass')
+            values = np.array(text.split(TEXT_SEPARATOR), dtype=object)
+            values[mask] = None
+            data[name] = pd.Series(values, dtype=dtype)
+    return pd.DataFrame(data)
+
+
+def _format_partition(block_name, columns, column_specs, row_dtype, row_function):
+    # Runs in a worker process; returns the rows, the per-column times and the CPU time used
+    cpu = time.process_time()
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        dataframe = rebuild_columns(block.buf, columns)
+    finally:
+        block.close()
+    stats = RunStats()
+    rows = row_function(dataframe, column_specs, stats, row_dtype=row_dtype)
+    return rows, stats.columns, time.process_time() - cpu
+
+
+def _release(block, futures):
+    # Cancels the row ranges not started yet and frees the block once the running ones are done with it
+    for future in futures:
+        future.cancel()
+    for future in futures:
+        if not future.cancelled():
+            future.exception()
+    block.close()
+    block.unlink()
+
+
+class ParallelFormatter:
+    """
+    A process pool that formats VALUES tuples (or the rows of another row_function with the arguments
+    of format_rows), a drop-in for format_rows in write_values and write_incremental_sql.
+    Use it as a context manager, it shuts the pool down on exit.
+    mp_context is passed to the pool, e.g. spawn where threads are running (the GUI).
+    """
+    def __init__(self, workers=FORMAT_WORKERS, mp_context=None):
+        self.workers = workers
+        # Workers register the blocks they attach to with the resource tracker (POSIX only). Started before
+        # them, this process' tracker is the one they share, instead of trackers of their own that report
+        # the blocks as leaked when the workers exit.
+        if os.name == 'posix':
+            resource_tracker.ensure_running()
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp_context)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    def _submit(self, dataframe, column_specs, stats, row_function):
+        # Returns the shared block and the futures of the chunk's row ranges, in row order
+        if not column_specs or not len(dataframe):
+            return None, []
+        wall, cpu = time.perf_counter(), time.process_time()
+        # The workers see only some columns, the upcast dtype of the whole chunk comes along, see format_columns
+        row_dtype = dataframe.iloc[:0].values.dtype
+        names = list(dict.fromkeys(spec.original_name for spec in column_specs))
+        partitions = _partitions(len(dataframe), self.workers)
+        block, descriptions = share_columns(dataframe, names, partitions)
+        futures = []
+        try:
+            for columns in descriptions:
+                futures.append(self.executor.submit(_format_partition, block.name, columns, column_specs, row_dtype,
+                                                    row_function))
+        except BaseException:
+            _release(block, futures)
+            raise
+        if stats is not None:
+            stats.add('share columns', time.perf_counter() - wall, time.process_time() - cpu, rows=len(dataframe))
+        return block, futures
+
+    def _collect(self, dataframe, column_specs, block, futures, stats, row_function):
+        # Waits for the row ranges in order
+        if not futures:
+            return row_function(dataframe, column_specs, stats)
+        wall = time.perf_counter()
+        try:
+            results = [future.result() for future in futures]
+        finally:
+            _release(block, futures)
+        if stats is not None:
+            stats.add('format', time.perf_counter() - wall, sum(cpu for _, _, cpu in results), rows=len(dataframe))
+            for _, columns, _ in results:
+                for name, phases in columns.items():
+                    for phase, entry in phases.items():
+                        stats.add_column(name, phase, entry['wall'], entry['cpu'])
+        return [row for rows, _, _ in results for row in rows]
+
+    def format_rows(self, dataframe, column_specs, stats=None, row_function=_format_rows):
+        """
+        Like converter.format_rows, on the pool. stats (an instrumentation.RunStats) gets the
+        'format' phase (wall time waited, CPU time of the workers) and the time of every column.
+        """
+        block, futures = self._submit(dataframe, column_specs, stats, row_function)
+        return self._collect(dataframe, column_specs, block, futures, stats, row_function)
+
+    def format_chunks(self, chunks, column_specs, stats=None, row_function=_format_rows):
+        """
+        Formats the chunks in order, yielding the tuples of each. The next PENDING_CHUNKS
+        chunks are handed to the pool before a chunk is yielded, so reading and writing overlap
+        with formatting.
+        """
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append((chunk, *self._submit(chunk, column_specs, stats, row_function)))
+                if len(pending) > PENDING_CHUNKS:
+                    chunk, block, futures = pending.popleft()
+                    yield self._collect(chunk, column_specs, block, futures, stats, row_function)
+            while pending:
+                chunk, block, futures = pending.popleft()
+                yield self._collect(chunk, column_specs, block, futures, stats, row_function)
+        finally:
+            # Cancelled or failed: the chunks still in flight give their blocks back
+            for _, block, futures in pending:
+                if block is not None:
+                    _release(block, futures)
@@ -0,0 +1,145 @@
+"""
+Saved column settings (profiles) of recurring files. A profile holds the edited ColumnSpec of every
+column and is found again by the sheet name and the ordered original column names, so a daily export
+with the same header opens with yesterday's types, NULLs, defaults and ENUM values and skips type
+inference. Profiles live in one JSON file; the least recently used ones are dropped when it grows
+over its size limit.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from converter import ColumnSpec
+
+PROFILE_CACHE_BYTES = 8 << 20 # Size limit of the profile file
+PROFILE_FORMAT = 1 # Version of the profile file layout
+SPEC_FIELDS = ['name', 'data_type', 'allow_null', 'default_value', 'enum_values_text']
+
+
+def default_profile_path():
+    """profiles.json in the user's local application data (Windows) or ~/.cache."""
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'excel_to_sql', 'profiles.json')
+
+
+def profile_key(columns, sheet_name=None):
+    """Hash of the sheet name (empty for CSV files) and the ordered original column names."""
+    text = json.dumps([sheet_name or '', [str(column) for column in columns]], ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _check_profile(key, profile):
+    # Imported files are checked before they can reach the column table
+    try:
+        columns, specs = profile['columns'], profile['column_specs']
+        valid = (isinstance(columns, list) and profile_key(columns, profile.get('sheet_name')) == key
+                 and all(isinstance(spec, dict) and set(SPEC_FIELDS) <= spec.keys()
+                         and isinstance(spec.get('column'), int) and 0 <= spec['column'] < len(columns)
+                         for spec in specs))
+    except (KeyError, TypeError):
+        valid = False
+    if not valid:
+        raise ValueError(f'Profile {key[:12]} is not a valid column profile.')
+
+
+class ProfileCache:
+    """
+    The profile file at path (default_profile_path() when None). Every call reads the file and every
+    change replaces it atomically, so the GUI and CLI runs can share it.
+    """
+    def __init__(self, path=None, max_bytes=PROFILE_CACHE_BYTES):
+        self.path = path or default_profile_path()
+        self.max_bytes = max_bytes
+
+    def _read(self, path=None):
+        path = path or self.path
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f'{path} is not a profile file: {e}')
+        if not isinstance(data, dict) or data.get('format') != PROFILE_FORMAT:
+            raise ValueError(f'{path} is not a profile file of this version.')
+        profiles = data.get('profiles', {})
+        for key, profile in profiles.items():
+            _check_profile(key, profile)
+        return profiles
+
+    def _write(self, profiles):
+        # Least recently used profiles go first until the file fits
+        sizes = {key: len(json.dumps(profile, ensure_ascii=False).encode('utf-8')) for key, profile in profiles.items()}
+        total = sum(sizes.values())
+        for key in sorted(profiles, key=lambda key: profiles[key].get('last_used', 0)):
+            if total <= self.max_bytes:
+                break
+            total -= sizes[key]
+            del profiles[key]
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(prefix='.profiles', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(handle, 'w', encoding='utf-8') as f:
+                json.dump({'format': PROFILE_FORMAT, 'profiles': profiles}, f, ensure_ascii=False)
+            os.replace(temporary, self.path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    def get(self, columns, sheet_name=None):
+        """
+        The saved column specs of a file with these original column names (in this order) on this
+        sheet, None when there is no profile. Columns removed in the column table stay removed.
+        """
+        columns = list(columns)
+        key = profile_key(columns, sheet_name)
+        profiles = self._read()
+        profile = profiles.get(key)
+        if profile is None:
+            return None
+        profile['last_used'] = time.time()
+        try:
+            self._write(profiles)
+        except OSError:
+            pass # A read-only cache still restores profiles, only their LRU order is not kept
+        return [ColumnSpec(original_name=columns[spec['column']], **{field: spec[field] for field in SPEC_FIELDS})
+                for spec in profile['column_specs']]
+
+    def put(self, columns, sheet_name, column_specs):
+        """Saves column_specs as the profile of these original column names on this sheet."""
+        columns = list(columns)
+        positions = {column: i for i, column in enumerate(columns)}
+        specs = []
+        for spec in column_specs:
+            entry = {'column': positions[spec.original_name]}
+            entry.update({field: getattr(spec, field) for field in SPEC_FIELDS})
+            specs.append(entry)
+        profiles = self._read()
+        profiles[profile_key(columns, sheet_name)] = {
+            'sheet_name': sheet_name or '', 'columns': [str(column) for column in columns],
+            'column_specs': specs, 'last_used': time.time()}
+        self._write(profiles)
+
+    def export(self, path):
+        """Writes every profile to path, a profile file for import_file(). Returns the number of profiles."""
+        profiles = self._read()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'format': PROFILE_FORMAT, 'profiles': profiles}, f, indent=2, ensure_ascii=False)
+        return len(profiles)
+
+    def import_file(self, path):
+        """
+        Adds the profiles of an exported file, replacing saved ones of the same files.
+        Raises ValueError for a file that is not a profile file. Returns the number of profiles.
+        """
+        imported = self._read(path)
+        now = time.time()
+        for profile in imported.values():
+            profile['last_used'] = now
+        profiles = self._read()
+        profiles.update(imported)
+        self._write(profiles)
+        return len(imported)
@@ -0,0 +1,162 @@
+"""
+Output files for the generated SQL: buffered, optionally compressed (gzip or zstd) and optionally
+split into numbered part files. Compression runs on worker threads over independent blocks, so the
+formatter keeps going while earlier blocks are compressed.
+"""
+import glob
+import gzip
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst'} # Compression name: file extension
+BLOCK_BYTES = 4 << 20 # Text collected before a block is handed to a compression thread
+COMPRESSION_WORKERS = min(4, os.cpu_count() or 1)
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+SPLIT_STATEMENT_BYTES = 1 << 20 # Statement size limit when splitting and no Max KB per INSERT is set
+
+
+def _gzip_block(data):
+    # Every block is a complete gzip member; concatenated members are one valid .gz file
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _zstd_block(data):
+    # Every block is a complete zstd frame; concatenated frames are one valid .zst file
+    import zstandard
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def compressor(compression):
+    """The block compression function for compression (None for none). Raises ImportError when zstandard is missing."""
+    if compression is None:
+        return None
+    if compression == 'gzip':
+        return _gzip_block
+    if compression == 'zstd':
+        try:
+            import zstandard # noqa: F401
+        except ImportError:
+            raise ImportError('zstd compression needs the zstandard package installed.')
+        return _zstd_block
+    raise ValueError(f"Unknown compression '{compression}', use one of {', '.join(COMPRESSIONS)}")
+
+
+def output_filename_for(output_filename, compression=None, part=None):
+    """
+    The file written for output_filename: data.sql becomes data.sql.gz with gzip,
+    and data.part002.sql(.gz) for the second part of a split output.
+    """
+    if part is not None:
+        stem, extension = os.path.splitext(output_filename)
+        output_filename = f'{stem}.part{part:03d}{extension}'
+    if compression:
+        output_filename += COMPRESSIONS[compression]
+    return output_filename
+
+
+class SqlOutput:
+    """
+    Text file sink with write() for InsertWriter. Text is encoded and collected into blocks of
+    block_bytes, which are compressed on a thread pool and written in order; at most two blocks
+    per thread are in flight, so memory stays bounded.
+
+    With max_part_bytes the output is split into part files (see output_filename_for). The sink only
+    tells whether more text fits into the current part (fits), the writer decides where a part may end
+    and calls new_part(). Part sizes count the uncompressed SQL text.
+    """
+    def __init__(self, output_filename, compression=None, max_part_bytes=None, workers=COMPRESSION_WORKERS,
+                 block_bytes=BLOCK_BYTES):
+        self.output_filename = output_filename
+        self.compression = compression
+        self.compress = compressor(compression)
+        self.max_part_bytes = max_part_bytes
+        self.block_bytes = block_bytes
+        self.executor = ThreadPoolExecutor(max_workers=workers) if self.compress else None
+        self.max_pending = 2 * workers
+        self.pending = deque() # Futures (or plain bytes) of blocks not yet written, in order
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.part_bytes = 0
+        self.bytes_written = 0 # Uncompressed, over all parts
+        self.paths = [] # Files written so far
+        self.file = None
+        self._open(1 if max_part_bytes else None)
+
+    def _open(self, part):
+        path = output_filename_for(self.output_filename, self.compression, part)
+        self.file = open(path, 'wb')
+        self.paths.append(path)
+        self.part_bytes = 0
+
+    def fits(self, nbytes):
+        return not self.max_part_bytes or self.part_bytes + nbytes <= self.max_part_bytes
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.buffer.append(data)
+        self.buffered_bytes += len(data)
+        self.part_bytes += len(data)
+        self.bytes_written += len(data)
+        if self.buffered_bytes >= self.block_bytes:
+            self._flush_block()
+
+    def _flush_block(self):
+        if not self.buffer:
+            return
+        data = b''.join(self.buffer)
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.pending.append(self.executor.submit(self.compress, data) if self.compress else data)
+        while len(self.pending) > self.max_pending:
+            self._write_oldest()
+
+    def _write_oldest(self):
+        block = self.pending.popleft()
+        self.file.write(block if isinstance(block, bytes) else block.result())
+
+    def _drain(self):
+        self._flush_block()
+        while self.pending:
+            self._write_oldest()
+
+    def new_part(self):
+        """Closes the current part file and continues in the next one."""
+        self._drain()
+        self.file.close()
+        self._open(len(self.paths) + 1)
+
+    def close(self):
+        """
+        Writes the remaining blocks and closes the file. Part files with higher numbers left over
+        from an earlier, longer output of the same name are removed, so the parts on disk are one load.
+        """
+        try:
+            self._drain()
+        finally:
+            self.file.close()
+            if self.executor:
+                self.executor.shutdown()
+        if self.max_part_bytes:
+            stem, extension = os.path.splitext(self.output_filename)
+            pattern = re.compile(re.escape(f'{stem}.part') + r'(\d{3,})' + re.escape(
+                extension + (COMPRESSIONS[self.compression] if self.compression else '')) + '$')
+            for path in glob.glob(glob.escape(stem) + '.part*'):
+                match = pattern.match(path)
+                if match and int(match.group(1)) > len(self.paths):
+                    os.remove(path)
+
+    def abort(self):
+        """Stops without writing the remaining blocks and removes every file written."""
+        for block in self.pending:
+            if not isinstance(block, bytes):
+                block.cancel()
+        self.pending.clear()
+        self.file.close()
+        if self.executor:
+            self.executor.shutdown()
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)